@@ -0,0 +1,59 @@
+"""Cold-start import cost of the tracker, as paid by every new worker process.
+
+Each statement is run in --repeat fresh interpreters, timing the imports from
+inside the process (so interpreter start-up itself is left out), and the median
+is reported together with which of the heavy dependencies ended up loaded.
+'gmphd' is the package as it is now imported; the 'eager' rows are what the
+single-module gmphd.py and the demos used to load up front (SciPy's optimize and
+linalg, then OpenCV and multiprocessing too).
+
+Run: `python bench_import.py [--repeat 20]`"""
+import argparse
+import statistics
+import subprocess
+import sys
+from os import path
+
+STATEMENTS = [
+    ('numpy', 'import numpy'),
+    ('gmphd', 'import gmphd'),
+    ('gmphd, then labelling', 'import gmphd; import scipy.optimize'),
+    ('eager gmphd.py', 'import numpy, scipy.optimize, scipy.linalg'),
+    ('eager demo', 'import numpy, scipy.optimize, scipy.linalg, cv2, multiprocessing'),
+]
+HEAVY = ('scipy', 'cv2', 'multiprocessing')
+
+PROBE = """import sys, time
+start = time.perf_counter()
+%s
+elapsed = time.perf_counter() - start
+print(elapsed, ' '.join(name for name in %r if name in sys.modules))"""
+
+
+def coldimport(statement):
+    "Seconds taken by 'statement' in a fresh interpreter, and the heavy modules it left loaded"
+    result = subprocess.run([sys.executable, '-c', PROBE % (statement, HEAVY)], capture_output=True, text=True,
+                            cwd=path.dirname(path.abspath(__file__)))
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    elapsed, _, loaded = result.stdout.strip().partition(' ')
+    return float(elapsed), loaded
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help='fresh interpreters per statement')
+    args = parser.parse_args()
+
+    print('%-24s %12s %12s   %s' % ('import', 'median ms', 'min ms', 'loaded'))
+    for label, statement in STATEMENTS:
+        times, loaded = [], ''
+        for _ in range(args.repeat):
+            elapsed, loaded = coldimport(statement)
+            if elapsed is None:
+                break
+            times.append(elapsed)
+        if not times:
+            print('%-24s %12s %12s   %s' % (label, '-', '-', loaded))  # e.g. OpenCV not installed
+            continue
+        print('%-24s %12.1f %12.1f   %s' % (label, 1e3 * statistics.median(times), 1e3 * min(times), loaded or '-'))
@@ -0,0 +1,107 @@
+"""Throughput, memory and accuracy of the float32 filter against the float64 one.
+
+Runs the same synthetic MOT-like scene (constant-velocity targets observed in
+pixel coordinates) through every combination of dtype and covariance/square-root
+mode, and reports per-frame time, mixture storage, peak allocation, and how far
+the float32 estimates drift from the float64 estimates of the same mode.
+Exits non-zero if the drift exceeds --tolerance pixels.
+
+Run: `python bench_precision.py [--frames 100] [--targets 40]`"""
+import argparse
+import sys
+import time
+import tracemalloc
+import numpy as np
+from gmphd import Gmphd, GmphdComponent
+
+
+def make_scene(frames, targets, width=1920, height=1080, seed=0):
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform((0, 0), (width, height), (targets, 2))
+    vel = rng.normal(0, 3, (targets, 2))
+    scene = []
+    for _ in range(frames):
+        pos = pos + vel
+        scene.append((pos + rng.normal(0, 2, pos.shape)).reshape(-1, 2, 1))
+    return scene
+
+
+def make_filter(dtype, sqrt, width=1920, height=1080):
+    F = np.array([[1, 0, 1, 0],
+                  [0, 1, 0, 1],
+                  [0, 0, 1, 0],
+                  [0, 0, 0, 1]])
+    P = np.diag([5 ** 2, 10 ** 2, 5 ** 2, 10 ** 2])
+    Q = P / 2
+    H = np.array([[1, 0, 0, 0],
+                  [0, 1, 0, 0]])
+    R = np.diag([5 ** 2, 10 ** 2])
+    birthgmm = [GmphdComponent(weight=1e-3, loc=[x, y, 0, 0], cov=P)
+                for x in range(0, width, 200) for y in range(0, height, 200)]
+    return Gmphd(birthgmm, 0.9, detection=0.99, f=F, q=Q, h=H, r=R, clutter=2.5e-7, sqrt=sqrt, dtype=dtype,
+                 verbose=False)
+
+
+def mixture_bytes(gmm):
+    return sum(comp.loc.nbytes + (comp._cov.nbytes if comp._cov is not None else 0) +
+               (comp._chol.nbytes if comp._chol is not None else 0) for comp in gmm)
+
+
+def run(scene, dtype, sqrt, trace=False):
+    tracker = make_filter(dtype, sqrt)
+    estimates, storage = [], []
+    elapsed = 0.0
+    if trace:
+        tracemalloc.start()
+    for obs in scene:
+        start = time.perf_counter()
+        tracker.update(obs)
+        tracker.prune(truncthresh=1e-3, mergethresh=5, maxcomponents=len(obs) + 50)
+        items = tracker.extractstatesusingintegral()
+        elapsed += time.perf_counter() - start
+        estimates.append(np.array(sorted(item[0][:2, 0].tolist() for item in items), dtype=np.float64))
+        storage.append(mixture_bytes(tracker.gmm))
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return estimates, elapsed / len(scene), max(storage), peak
+
+
+def measure(scene, dtype, sqrt):
+    "Timed run, then a traced run for the peak allocation (tracing would distort the timing)"
+    estimates, ms, storage, _ = run(scene, dtype, sqrt)
+    peak = run(scene, dtype, sqrt, trace=True)[3]
+    return estimates, ms, storage, peak
+
+
+def drift(estimates, reference):
+    "Largest position difference between matching frames, or inf if the estimated counts differ"
+    worst = 0.0
+    for est, ref in zip(estimates, reference):
+        if est.shape != ref.shape:
+            return float('inf')
+        if est.size:
+            worst = max(worst, float(np.abs(est - ref).max()))
+    return worst
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--targets', type=int, default=20)
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed float32 drift, in pixels')
+    args = parser.parse_args()
+
+    scene = make_scene(args.frames, args.targets)
+    failed = False
+    print('%-6s %-8s %10s %14s %14s %12s' % ('mode', 'dtype', 'ms/frame', 'mixture KiB', 'peak KiB', 'drift px'))
+    for sqrt in (False, True):
+        mode = 'sqrt' if sqrt else 'cov'
+        reference, ms, storage, peak = measure(scene, np.float64, sqrt)
+        print('%-6s %-8s %10.2f %14.1f %14.1f %12s' % (mode, 'float64', ms * 1e3, storage / 1024, peak / 1024, '-'))
+        estimates, ms, storage, peak = measure(scene, np.float32, sqrt)
+        error = drift(estimates, reference)
+        print('%-6s %-8s %10.2f %14.1f %14.1f %12.4f' % (mode, 'float32', ms * 1e3, storage / 1024, peak / 1024, error))
+        failed = failed or error > args.tolerance
+    sys.exit(1 if failed else 0)
@@ -1,16 +1,13 @@
-from gmphd import *
+from gmphd import Gmphd, GmphdComponent, BoxObservations, read_boxes
 import os
 from os import path
 import collections
 import numpy as np
-import cv2
 import time
-import multiprocessing as mp
 
 
 def read_mot(relpath='./MOT17-02/'):
     names = collections.defaultdict(list)
-    detections = collections.defaultdict(list)
 
     # Store the image names.
     for file in os.listdir(path.join(relpath, 'img1')):
@@ -18,13 +15,8 @@ def read_mot(relpath='./MOT17-02/'):
             name, extension = file.split('.')
             names[int(name)] = file
 
-    # Load the detections.
-    # <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, <x>, <y>
-    with open(path.join(relpath, 'gt/gt.txt'), mode='r') as file:
-        for line in file:
-            line = line.replace('\n', '')
-            frame, id, bb_left, bb_top, bb_width, bb_height, conf, x, y = map(float, line.split(','))
-            detections[frame].append(np.array([bb_left, bb_top, bb_width, bb_height]).reshape(4, 1))
+    # Load the detections, as per-frame views of one contiguous array.
+    detections = read_boxes(path.join(relpath, 'gt/gt.txt'))
 
     return names, detections
 
@@ -67,38 +59,44 @@ if __name__ == '__main__':
 
     tracker = Gmphd(birthgmm, survivalprob, detection=detectprob, f=F, q=Q, h=H, r=R, clutter=pdf_c)
     names, detections = read_mot()
-    pool = mp.Pool(processes=mp.cpu_count())
+    observe = BoxObservations('centre')  # center of bbox, into a buffer reused every frame
+
+    # Worker processes sharing out the observations, or 0 to update in this process.
+    processes = os.cpu_count()
+    # False to run headless: no images are read, annotated, shown or encoded, and OpenCV is never loaded.
+    display = True
+    if processes:
+        import multiprocessing as mp
+        pool = mp.Pool(processes=processes)
+    if display:
+        import cv2
+        from gmphd.render import VideoSink, draw_points, draw_caption
+        sink = VideoSink('./MOT17-02/MOT17-02.avi', fps=30)
 
     for frame in range(min(names.keys()), max(names.keys())):
         # Perform a prediction-update step.
         start = time.time()
-        obs = numpy.array(detections[frame], dtype=float)
-        tracker.update_mp(obs[:, :2] + (obs[:, 2:] / 2.0), pool)  # center of bbox
+        obs = observe(detections[frame])
+        if processes:
+            tracker.update_mp(obs, pool)
+        else:
+            tracker.update(obs)
         tracker.prune(truncthresh=1e-3, mergethresh=5, maxcomponents=len(obs) + 50)
         fps = time.time() - start
 
-        integral = sum(np.array([comp.weight for comp in tracker.gmm]))
+        integral = sum(comp.weight for comp in tracker.gmm)
         estitems = tracker.extractstatesusingintegral(bias=bias)
 
-        image = cv2.imread(path.join('./MOT17-02/img1', names[frame]))
-        for comp in estitems:
-            (x, y), id = (comp[0][0], comp[0][1]), comp[1]
-            image = cv2.circle(image, (x, y), radius=8,
-                               color=(255, 255, 255), thickness=-1)
-            image = cv2.putText(image, str(id),
-                                org=(x+5, y+5), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.65,
-                                color=(0, 255, 255), thickness=2)
-
-        # Plot the detections.
-        #if frame in detections:
-        #   for x, y, u, v in detections[frame]:
-        #        image = cv2.rectangle(image, (x, y), (x + u, y + v), color=(0, 0, 0), thickness=2)
-        image = cv2.putText(image, 'Frame {}'.format(frame) + ', FPS:{}'.format(round(1 / fps, 2)),
-                            org=(im_width - 400, 30), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1,
-                            color=(255, 255, 255), thickness=2)
-        cv2.imwrite('./MOT17-02/output/' + str(frame) + '.jpg', image)
-        cv2.imshow('Image', image)
-        cv2.waitKey(1)
+        if display:
+            image = cv2.imread(path.join('./MOT17-02/img1', names[frame]))
+            draw_points(image, [comp[0][:2, 0] for comp in estitems], [comp[1] for comp in estitems])
+            draw_caption(image, 'Frame {}'.format(frame) + ', FPS:{}'.format(round(1 / fps, 2)), org=(im_width - 400, 30))
+            sink.write(image)
+            cv2.imshow('Image', image)
+            cv2.waitKey(1)
 
-    # making video from output images
-    os.system("ffmpeg -r 30 -i ./MOT17-02/output/%d.jpg -vcodec mpeg4 -y ./MOT17-02/MOT17-02.avi")
+    if display:
+        sink.close()
+        if sink.dropped:
+            print('%i frames dropped by the video sink, the encoder fell behind; '
+                  'VideoSink(..., block=True) keeps them all' % sink.dropped)
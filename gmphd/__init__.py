@@ -0,0 +1,14 @@
+"""GM-PHD multi-target tracking (Vo and Ma), with track labelling for MOT.
+
+The filter, its track history and the observation helpers only need numpy.
+SciPy is loaded on first use of the square-root filter or of the labelling in
+Gmphd.extractstatesusingintegral(), and OpenCV only by gmphd.render, which is
+not imported here; import it explicitly for drawing and video output."""
+from .filter import (Gmphd, GmphdComponent, DecimationSchedule, IdAllocator, StageProfile, TrackHistory,
+                     dmvnorm, dmvnorm_chol, cholupdate, symmetrise, myfloat)
+from .measurements import BoxObservations, read_boxes
+from .partition import PartitionedGmphd
+
+__all__ = ['Gmphd', 'GmphdComponent', 'DecimationSchedule', 'IdAllocator', 'StageProfile', 'TrackHistory',
+           'dmvnorm', 'dmvnorm_chol', 'cholupdate', 'symmetrise', 'myfloat',
+           'BoxObservations', 'read_boxes', 'PartitionedGmphd']
@@ -0,0 +1,734 @@
+"""The GM-PHD filter itself: Gaussian components, the filter, and its track history.
+
+SciPy is only imported on first use, by the square-root filter (triangular
+solves) and by the labelling in extractstatesusingintegral() (the assignment
+solver), so importing this module costs no more than importing numpy."""
+from contextlib import contextmanager, nullcontext
+from copy import copy, deepcopy
+from functools import partial, wraps
+from operator import attrgetter
+import time
+import numpy as np
+
+myfloat = np.float64
+
+
+class GmphdComponent:
+    """Represents a single Gaussian component,
+    with a float weight, vector location, matrix covariance.
+    Note that we don't require a GM to sum to 1, since not always about proby densities.
+    The covariance can be given either as 'cov' or as its lower Cholesky factor 'chol'
+    (cov = chol chol.T); whichever is missing, and the inverse, are worked out on first use.
+    'dtype' is the storage type of the location and covariance; the weight is always a myfloat.
+    'id' is an integer from the filter's IdAllocator; components made without one get -1 until a filter numbers them."""
+
+    def __init__(self, weight, loc, cov=None, id=None, chol=None, dtype=myfloat):
+        self.weight = myfloat(weight)
+        self.loc = np.array(loc, dtype=dtype, ndmin=2)
+        self.loc = np.reshape(self.loc, (np.size(self.loc), 1))  # enforce column vec
+        self._cov = self._chol = self._invcov = None
+        if chol is not None:
+            self._chol = np.reshape(np.array(chol, dtype=dtype), (np.size(self.loc), np.size(self.loc)))
+        else:
+            self._cov = np.reshape(np.array(cov, dtype=dtype), (np.size(self.loc), np.size(self.loc)))  # ensure shape matches loc shape
+        self.id = -1 if id is None else int(id)
+
+    @property
+    def cov(self):
+        if self._cov is None:
+            self._cov = np.dot(self._chol, self._chol.T)
+        return self._cov
+
+    @property
+    def chol(self):
+        if self._chol is None:
+            self._chol = np.linalg.cholesky(self._cov.astype(myfloat)).astype(self.loc.dtype)
+        return self._chol
+
+    @property
+    def invcov(self):
+        if self._invcov is None:
+            self._invcov = np.linalg.inv(self.cov.astype(myfloat)).astype(self.loc.dtype)
+        return self._invcov
+
+    def astype(self, dtype):
+        "A copy of this component with its location and covariance stored as 'dtype'"
+        if self._chol is not None:
+            return GmphdComponent(self.weight, self.loc, id=self.id, chol=self._chol, dtype=dtype)
+        return GmphdComponent(self.weight, self.loc, self._cov, self.id, dtype=dtype)
+
+
+_solve_triangular = None  # scipy.linalg.solve_triangular, once the square-root filter has needed it
+
+
+def solve_triangular(a, b, lower=False):
+    "scipy.linalg.solve_triangular, with SciPy imported on the first call rather than with this module"
+    global _solve_triangular
+    if _solve_triangular is None:
+        from scipy.linalg import solve_triangular as _solve_triangular
+    return _solve_triangular(a, b, lower=lower)
+
+
+# We don't always have a GmphdComponent object so:
+def dmvnorm(loc, cov, x):
+    "Evaluate a multivariate normal, given a location (vector) and covariance (matrix) and a position x (vector) at which to evaluate"
+    # The multivariate normal distribution
+    # f(x1,x2,...,xk) = exp(-1/2 * (x-mu).T * cov-1 * (x-mu)) / sqrt((2*pi)^k * det(cov))
+    # The arithmetic is done in the dtype of 'cov', except the determinant and the inverse which are always taken as myfloat
+    cov = np.asarray(cov)
+    loc = np.asarray(loc, dtype=cov.dtype)
+    x = np.asarray(x, dtype=cov.dtype)
+    k = len(loc)
+    part1 = (2.0 * np.pi) ** (-k * 0.5)
+    part2 = np.power(np.linalg.det(cov.astype(myfloat)), -0.5)
+    dev = x - loc
+    part3 = np.exp(-0.5 * np.dot(np.dot(dev.T, np.linalg.inv(cov.astype(myfloat)).astype(cov.dtype)), dev).item())
+    return part1 * part2 * part3
+
+
+def dmvnorm_chol(loc, chol, x):
+    "As dmvnorm, but with the covariance given by its lower Cholesky factor; uses a triangular solve instead of det and inv"
+    dev = solve_triangular(chol, np.asarray(x, dtype=chol.dtype) - loc, lower=True)
+    logdet = 2.0 * sum(np.log(np.diagonal(chol).astype(myfloat)))
+    return np.exp(-0.5 * (len(loc) * np.log(2.0 * np.pi) + logdet + np.dot(dev.T, dev).item()))
+
+
+def cholupdate(*factors):
+    """Lower Cholesky factor L such that L L.T = sum(B B.T for B in factors).
+      Each B has the same number of rows; the factor is found by QR of the stacked B.T
+      so the sum of squares is never formed explicitly."""
+    r = np.linalg.qr(np.hstack(factors).T, mode='r')
+    r[np.diagonal(r) < 0] *= -1  # QR is unique up to row signs; keep the diagonal positive
+    return r.T
+
+
+def symmetrise(cov, dtype=myfloat):
+    "Average a covariance with its transpose, working in myfloat, and store the result as 'dtype'"
+    cov = np.asarray(cov, dtype=myfloat)
+    return ((cov + cov.T) * 0.5).astype(dtype)
+
+
+class IdAllocator:
+    """Hands out int64 component ids in increasing order. Being plain state, it is saved and
+      restored along with the filter when that is pickled, so ids stay unique across checkpoints.
+      A worker is given a reserved block of ids and numbers its components from the start of
+      the block, which keeps ids unique, and deterministic, across parallel workers."""
+
+    def __init__(self, start=0):
+        self.nextid = start
+
+    def allocate(self, count=1):
+        "Reserve 'count' consecutive ids; returns the first of them."
+        first = self.nextid
+        self.nextid += count
+        return first
+
+
+class TrackHistory:
+    """The last 'length' frames of every live track, in preallocated ring buffers with one row per track.
+      Each entry is written twice, at its slot and 'length' slots further on, so that the last
+      'length' entries of a track are always contiguous and trajectory() can return views.
+      Tracks not seen for more than 'timeout' frames are evicted and their rows reused;
+      the buffers only grow (doubling) when more tracks are alive at once than ever before."""
+
+    def __init__(self, dim, length=30, timeout=30, capacity=64, dtype=myfloat):
+        self.length = length
+        self.timeout = timeout
+        self.latestframe = None  # frame of the most recent append()
+        self.latestrows = np.zeros(0, dtype=np.intp)  # rows of the most recent append(), in its order
+        self.rows = {}  # track id -> row
+        self.states = np.zeros((capacity, 2 * length, dim), dtype=dtype)
+        self.frames = np.zeros((capacity, 2 * length), dtype=np.int64)
+        self.compids = np.zeros((capacity, 2 * length), dtype=np.int64)
+        self.trackids = np.zeros(capacity, dtype=np.int64)
+        self.head = np.zeros(capacity, dtype=np.intp)  # slot of the next entry, in 0..length-1
+        self.count = np.zeros(capacity, dtype=np.intp)  # number of entries held, up to length
+        self.lastseen = np.full(capacity, -1, dtype=np.int64)  # -1 marks a free row
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        capacity = len(self.trackids)
+        for name in ('states', 'frames', 'compids', 'trackids', 'head', 'count', 'lastseen'):
+            old = getattr(self, name)
+            new = np.zeros((2 * capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+        self.lastseen[capacity:] = -1
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def append(self, frame, trackids, compids, states):
+        """Add one frame's estimates: N track ids, N component ids and an (N, dim) array of states."""
+        rows = np.empty(len(trackids), dtype=np.intp)
+        for i, trackid in enumerate(trackids):
+            row = self.rows.get(trackid)
+            if row is None:
+                if not self.free:
+                    self._grow()
+                row = self.rows[trackid] = self.free.pop()
+                self.trackids[row], self.head[row], self.count[row] = trackid, 0, 0
+            rows[i] = row
+        slots = self.head[rows]
+        for slot in (slots, slots + self.length):
+            self.states[rows, slot] = states
+            self.frames[rows, slot] = frame
+            self.compids[rows, slot] = compids
+        self.head[rows] = (slots + 1) % self.length
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.length)
+        self.lastseen[rows] = frame
+        self.latestframe = frame
+        self.latestrows = rows
+        # evict the tracks that have been gone too long
+        for row in np.flatnonzero((self.lastseen >= 0) & (self.lastseen < frame - self.timeout)):
+            del self.rows[int(self.trackids[row])]
+            self.lastseen[row] = -1
+            self.free.append(row)
+
+    def trajectory(self, trackid):
+        """(frames, compids, states) of a track, oldest first, as views into the buffers."""
+        row = self.rows[trackid]
+        end = self.head[row] + self.length
+        window = slice(end - self.count[row], end)
+        return self.frames[row, window], self.compids[row, window], self.states[row, window]
+
+    def latest(self):
+        """(trackids, compids, states) of the tracks in the most recent append(), in the same order."""
+        rows = self.latestrows
+        slots = (self.head[rows] - 1) % self.length
+        return self.trackids[rows], self.compids[rows, slots], self.states[rows, slots]
+
+
+class StageProfile:
+    """Wall-clock time spent in each stage of a Gmphd, frame by frame. Profiling is off unless
+      one of these is set as the filter's 'profile'.
+      'rows' holds a (frame, {stage: seconds}) entry per begin() call; stages timed before
+      the first begin() go to a row of frame None.
+      Under a PartitionedGmphd, 'route' is the sharing out of components and observations
+      to the tiles, 'update' the parallel tile step (which constructs, updates and prunes
+      each tile), and 'prune' the merge across tile borders."""
+
+    STAGES = ('predict', 'route', 'construct', 'update', 'prune', 'extract')
+
+    def __init__(self):
+        self.rows = []
+
+    def begin(self, frame):
+        "Start the row of a new frame."
+        self.rows.append((frame, {}))
+
+    @contextmanager
+    def stage(self, name):
+        if not self.rows:
+            self.begin(None)
+        times = self.rows[-1][1]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            times[name] = times.get(name, 0.0) + time.perf_counter() - start
+
+    def summary(self):
+        "Per stage: (total, mean per frame, max per frame) in seconds"
+        result = {}
+        for name in self.STAGES:
+            times = [row.get(name, 0.0) for _, row in self.rows]
+            if any(times):
+                result[name] = (sum(times), sum(times) / len(times), max(times))
+        return result
+
+    def slowest(self, count=5):
+        "The 'count' rows with the most time in all stages together, slowest first"
+        return sorted(self.rows, key=lambda row: sum(row[1].values()), reverse=True)[:count]
+
+
+def timed(stage):
+    "Decorator timing a Gmphd method as 'stage' of the filter's profile, when it has one."
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.stage(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+################################################################################
+class Gmphd:
+    """Represents a set of modelling parameters and the latest frame's
+       GMM estimate, for a GM-PHD model without spawning.
+
+       Typical usage would be, for each frame of input data, to run:
+          g.update(obs)
+          g.prune()
+          estimate = g.extractstates()
+
+      'gmm' is an array of GmphdComponent items which makes up
+           the latest GMM, and updated by the update() call.
+           It is initialised as empty."""
+
+    def __init__(self, birthgmm, survival, detection, f, q, h, r, clutter, sqrt=False, dtype=myfloat,
+                 history=30, timeout=30, budget=None, verbose=True):
+        """
+          'birthgmm' is an array of GmphdComponent items which makes up
+               the GMM of birth probabilities.
+          'survival' is survival probability.
+          'detection' is detection probability.
+          'f' is state transition matrix F.
+          'q' is the process noise covariance Q.
+          'h' is the observation matrix H.
+          'r' is the observation noise covariance R.
+          'clutter' is the clutter intensity.
+          'sqrt' selects the square-root filter, in which components carry Cholesky factors
+               of their covariances that are propagated by QR, and no matrix is ever inverted.
+          'dtype' is the storage type of the mixture, the model matrices and the observations
+               (e.g. float32 for pixel coordinates). Weights, their normalisation, (log-)determinants,
+               inverses, Cholesky factorisations and the symmetrisation of covariances
+               are always worked in myfloat.
+          'history' is the number of frames of each track kept in 'tracks', a TrackHistory.
+          'timeout' is the number of frames after which an unseen track is dropped from 'tracks'.
+          'budget', if given, caps the number of predicted components going into each update, see reduce().
+               It must exceed the number of birth components, which are never cut.
+          'verbose' prints the per-frame diagnostics of prune() and the state extraction on stdout.
+          """
+        if budget is not None and budget <= len(birthgmm):
+            raise ValueError('a budget of %i leaves no room for survivors beside the %i births' % (budget, len(birthgmm)))
+        self.gmm = []  # empty - things will need to be born before we observe them
+        self.dtype = dtype
+        self.birthgmm = [comp.astype(dtype) for comp in birthgmm]
+        self.ids = IdAllocator()  # component ids
+        for comp in self.birthgmm:
+            if comp.id < 0:
+                comp.id = self.ids.allocate()  # the births of every frame share their template's id
+        self.survival = myfloat(survival)  # p_{s,k}(x) in paper
+        self.detection = myfloat(detection)  # p_{d,k}(x) in paper
+        self.f = np.array(f, dtype=dtype)  # state transition matrix      (F_k-1 in paper)
+        self.q = np.array(q, dtype=dtype)  # process noise covariance     (Q_k-1 in paper)
+        self.h = np.array(h, dtype=dtype)  # observation matrix           (H_k in paper)
+        self.r = np.array(r, dtype=dtype)  # observation noise covariance (R_k in paper)
+        self.clutter = myfloat(clutter)  # clutter intensity (KAU in paper)
+        self.sqrt = sqrt
+        self.transitions = {}  # F^n, Q_n per step count, see transition()
+        self.budget = budget
+        self.budgetcell = np.sqrt(np.diagonal(self.r).astype(myfloat))  # grid spacing of reduce(), in observation space
+        if sqrt:
+            self.sqrtr = np.linalg.cholesky(np.array(r, dtype=myfloat)).astype(dtype)
+            for comp in self.birthgmm:
+                comp.chol  # factorise once here rather than in every per-frame copy
+
+        self.track_id = 0
+        self.frame = 0  # frames seen so far, including skipped ones
+        self.tracks = TrackHistory(len(self.f), length=history, timeout=timeout, dtype=dtype)
+        self.profile = None  # a StageProfile, to time the stages of every frame
+        self.verbose = verbose
+
+    def __getstate__(self):
+        # the profile stays in the process doing the timing; copies sent to workers go without it
+        state = self.__dict__.copy()
+        state['profile'] = None
+        return state
+
+    def model(self):
+        """A shallow copy with the model only, without the mixture, the births and the track history,
+          to ship to worker processes, which never read those."""
+        model = copy(self)
+        model.gmm, model.birthgmm, model.tracks = [], [], None
+        return model
+
+    def stage(self, name):
+        "Context timing the stage 'name' into the profile; does nothing when profiling is off."
+        return nullcontext() if self.profile is None else self.profile.stage(name)
+
+    def transition(self, steps=1):
+        """The motion model over 'steps' frames: (F^n, Q_n, sqrt(Q_n)) with
+          Q_n = sum of F^i Q F^i' for i < n, so that n single predictions equal one of these.
+          Worked in myfloat and cached per step count."""
+        if steps not in self.transitions:
+            f, q = self.f.astype(myfloat), self.q.astype(myfloat)
+            fn, qn = np.eye(len(f)), np.zeros_like(q)
+            for _ in range(steps):
+                qn = np.dot(np.dot(f, qn), f.T) + q
+                fn = np.dot(f, fn)
+            qn = symmetrise(qn)
+            sqrtqn = np.linalg.cholesky(qn).astype(self.dtype) if self.sqrt else None
+            self.transitions[steps] = (fn.astype(self.dtype), qn.astype(self.dtype), sqrtqn)
+        return self.transitions[steps]
+
+    def survive(self, steps=1):
+        """Step 2 - prediction for existing targets, 'steps' frames ahead. Doesn't alter model state."""
+        f, q, sqrtq = self.transition(steps)
+        survival = self.survival ** steps
+        if self.sqrt:
+            return [GmphdComponent(survival * comp.weight, np.dot(f, comp.loc), id=comp.id,
+                                   chol=cholupdate(np.dot(f, comp.chol), sqrtq), dtype=self.dtype)
+                    for comp in self.gmm]
+        return [GmphdComponent(survival * comp.weight, np.dot(f, comp.loc),
+                               symmetrise(q + np.dot(np.dot(f, comp.cov), f.T), self.dtype), comp.id,
+                               dtype=self.dtype)
+                for comp in self.gmm]
+
+    @timed('predict')
+    def predict(self, steps=1):
+        """Steps 1 and 2 of the GM-PHD recursion: the birth components plus the
+          surviving components moved on by the motion model. Doesn't alter model state.
+          'steps' is the number of frames since the mixture was last updated."""
+        #######################################
+        # Step 1 - prediction for birth targets
+        born = [deepcopy(comp) for comp in self.birthgmm]
+        # The original paper would do a spawning iteration as part of Step 1.
+        spawned = []  # not implemented
+
+        #######################################
+        # Step 2 - prediction for existing targets
+        updated = self.survive(steps)
+
+        return born + spawned + updated
+
+    def coast(self, steps=1):
+        """Prediction-only step for frames whose observations are not used: moves the
+          mixture on by 'steps' frames, with survival but no births and no update. Alters model state.
+          Alternatively skip the frames altogether and pass 'steps' to the next update()."""
+        self.gmm = self.survive(steps)
+        self.frame += steps
+
+    @timed('extract')
+    def extrapolatestates(self, steps=1):
+        """The states from the last extractstatesusingintegral() call, moved on by 'steps' frames
+          of the motion model, keeping their track ids. Gives labelled output for frames
+          without an update; doesn't alter model state."""
+        fn = self.transition(steps)[0]
+        trackids, compids, states = self.tracks.latest()
+        return [[np.dot(fn, state[:, np.newaxis]), trackid, compid] for trackid, compid, state in zip(trackids, compids, states)]
+
+    @timed('construct')
+    def construct(self, predicted):
+        """Step 3 - construction of PHD update components.
+          Returns (nu, s, pkk, k); in the square-root filter 's' and 'pkk' hold Cholesky factors."""
+        # These two are the mean and covariance of the expected observation
+        nu = [np.dot(self.h, comp.loc) for comp in predicted]
+        if self.sqrt:
+            s = [cholupdate(np.dot(self.h, comp.chol), self.sqrtr) for comp in predicted]
+            # K = P H' S^-1, by two triangular solves against the factor of S
+            k = [solve_triangular(s[index].T,
+                                  solve_triangular(s[index], np.dot(self.h, comp.cov), lower=True), lower=False).T
+                 for index, comp in enumerate(predicted)]
+            # Joseph form (I-KH) P (I-KH)' + K R K', which factorises without any subtraction of squares
+            pkk = [cholupdate(np.dot(np.eye(len(k[index]), dtype=self.dtype) - np.dot(k[index], self.h), comp.chol),
+                              np.dot(k[index], self.sqrtr))
+                   for index, comp in enumerate(predicted)]
+            return nu, s, pkk, k
+        s = [self.r + np.dot(np.dot(self.h, comp.cov), self.h.T) for comp in predicted]
+        # Not sure about any physical interpretation of these two...
+        k = [np.dot(np.dot(comp.cov, self.h.T), np.linalg.inv(s[index].astype(myfloat)).astype(self.dtype))
+             for index, comp in enumerate(predicted)]
+        pkk = [symmetrise(np.dot(np.eye(len(k[index]), dtype=self.dtype) - np.dot(k[index], self.h), comp.cov), self.dtype)
+               for index, comp in enumerate(predicted)]
+        return nu, s, pkk, k
+
+    def missed(self, predicted):
+        """The 'predicted' components are kept, with a decay, for the case of no detection."""
+        if self.sqrt:
+            return [GmphdComponent(comp.weight * (1.0 - self.detection), comp.loc, id=comp.id, chol=comp.chol,
+                                   dtype=self.dtype)
+                    for comp in predicted]
+        return [GmphdComponent(comp.weight * (1.0 - self.detection), comp.loc, comp.cov, comp.id, dtype=self.dtype)
+                for comp in predicted]
+
+    def observations(self, obs):
+        """This frame's observations as a C-contiguous (M, d) array of the filter's dtype, d being
+          the size of an observation. Such an array is returned as it is, without a copy; anything else
+          that numpy can read (a buffer-protocol object, a list of (d, 1) vectors) is converted once."""
+        obs = np.ascontiguousarray(obs, dtype=self.dtype)
+        if obs.size != len(obs) * len(self.h):
+            raise ValueError('expected observations of size %i, got an array of shape %s' % (len(self.h), obs.shape))
+        return obs.reshape(len(obs), len(self.h))
+
+    def update(self, obs, steps=1):
+        """Run a single GM-PHD step given a new frame of observations.
+          'obs' is this frame's observations, an (M, d) array; see observations().
+          'steps' is the number of frames since the last update, when frames have been skipped.
+          Based on Table 1 from Vo and Ma paper."""
+        obs = self.observations(obs)
+        predicted = self.reduce(self.predict(steps))
+        nu, s, pkk, k = self.construct(predicted)
+
+        #######################################
+        # Step 4 - update using observations
+        with self.stage('update'):
+            newgmm = self.missed(predicted)
+
+            # then more components are added caused by each obsn's interaction with existing component
+            firstid = self.ids.allocate(len(obs) * len(predicted))
+            for index, anobs in enumerate(obs):
+                newgmm.extend(self.update_obs_mp(anobs, firstid + index * len(predicted), predicted, nu, s, pkk, k))
+
+        self.gmm = newgmm
+        self.frame += steps
+
+    def merge(self, subsumed):
+        """A single component which moment-matches the 'subsumed' components.
+          The first of them is the weightiest; its id is kept."""
+        weightiest = subsumed[0]
+        aggweight = sum(comp.weight for comp in subsumed)
+        if self.sqrt:
+            # the same moment-matched covariance, assembled as a factor from the weighted factors and spreads
+            return GmphdComponent(aggweight,
+                                  np.sum(np.array([comp.weight * comp.loc for comp in subsumed]), 0) / aggweight,
+                                  id=weightiest.id,
+                                  chol=cholupdate(*[np.sqrt(comp.weight / aggweight).astype(self.dtype) *
+                                                    np.hstack((comp.chol, weightiest.loc - comp.loc))
+                                                    for comp in subsumed]),
+                                  dtype=self.dtype)
+        return GmphdComponent(aggweight,
+                              np.sum(np.array([comp.weight * comp.loc for comp in subsumed]), 0) / aggweight,
+                              np.sum(np.array([comp.weight * (
+                                      comp.cov + (weightiest.loc - comp.loc) * (weightiest.loc - comp.loc).T)
+                                         for comp in subsumed]), 0) / aggweight,
+                              weightiest.id, dtype=self.dtype)
+
+    @timed('predict')
+    def reduce(self, predicted):
+        """Cap the predicted mixture, as returned by predict(), at 'budget' components before the
+          update, so that an update creates at most budget x (observations + 1) components.
+          Doesn't alter model state.
+          The birth components are always kept whole, so that targets can appear anywhere;
+          the surviving components share the rest of the budget. Survivors whose expected
+          observations fall in the same cell of a grid with one measurement standard deviation
+          spacing are merged first, then only the weightiest are kept; the survivors' total
+          weight is preserved."""
+        if self.budget is None or len(predicted) <= self.budget:
+            return predicted
+        born, survivors = predicted[:len(self.birthgmm)], predicted[len(self.birthgmm):]
+        weights = np.array([comp.weight for comp in survivors])
+        total = weights.sum()
+        cells = np.floor(np.array([np.dot(self.h, comp.loc)[:, 0] for comp in survivors]) / self.budgetcell).astype(np.int64)
+        group = np.unique(cells, axis=0, return_inverse=True)[1].ravel()  # cell index, by sorting the cells
+        groups = {}
+        for index in np.argsort(-weights, kind='stable'):  # weightiest first in each group
+            groups.setdefault(group[index], []).append(survivors[index])
+        reduced = [members[0] if len(members) == 1 else self.merge(members) for members in groups.values()]
+        room = self.budget - len(born)
+        if len(reduced) > room:
+            reduced.sort(key=attrgetter('weight'), reverse=True)
+            reduced = reduced[:room]
+            weightnorm = total / sum(comp.weight for comp in reduced)
+            for comp in reduced:
+                comp.weight *= weightnorm
+        return born + reduced
+
+    @timed('prune')
+    def prune(self, truncthresh=1e-6, mergethresh=0.01, maxcomponents=100):
+        """Prune the GMM. Alters model state.
+          Based on Table 2 from Vo and Ma paper."""
+        # Truncation is easy
+        weightsums = [sum(comp.weight for comp in self.gmm)]  # diagnostic
+        sourcegmm = list(filter(lambda comp: comp.weight > truncthresh, self.gmm))
+        weightsums.append(sum(comp.weight for comp in sourcegmm))
+        origlen = len(self.gmm)
+        trunclen = len(sourcegmm)
+        # Iterate to build the new GMM
+        newgmm = []
+        while len(sourcegmm) > 0:
+            # find weightiest old component and pull it out
+            windex = np.argmax(comp.weight for comp in sourcegmm)
+            weightiest = sourcegmm[windex]
+            sourcegmm = sourcegmm[:windex] + sourcegmm[windex + 1:]
+            # find all nearby ones and pull them out
+            if self.sqrt:
+                # |L^-1 d|^2 by a triangular solve, rather than d' P^-1 d with an explicit inverse
+                distances = [float(np.sum(solve_triangular(comp.chol, comp.loc - weightiest.loc, lower=True) ** 2))
+                             for comp in sourcegmm]
+            else:
+                distances = [np.dot(np.dot((comp.loc - weightiest.loc).T, comp.invcov), comp.loc - weightiest.loc).item()
+                             for comp in sourcegmm]
+            dosubsume = np.array([dist <= mergethresh for dist in distances])
+            subsumed = [weightiest]
+            if np.any(dosubsume):
+                # print("Subsuming the following locations into weightest with loc %s and weight %g (cov %s):" \
+                #	% (','.join([str(x) for x in weightiest.loc.flat]), weightiest.weight, ','.join([str(x) for x in weightiest.cov.flat]))
+                # print(list([comp.loc[0][0] for comp in list(array(sourcegmm)[ dosubsume]) ])
+                subsumed.extend(list(np.array(sourcegmm)[dosubsume]))
+                sourcegmm = list(np.array(sourcegmm)[~dosubsume])
+            # create unified new component from subsumed ones
+            newgmm.append(self.merge(subsumed))
+
+        # Now ensure the number of components is within the limit, keeping the weightiest
+        newgmm.sort(key=attrgetter('weight'))
+        newgmm.reverse()
+        self.gmm = newgmm[:maxcomponents]
+        weightsums.append(sum(comp.weight for comp in newgmm))
+        weightsums.append(sum(comp.weight for comp in self.gmm))
+        if self.verbose:
+            print("prune(): %i -> %i -> %i -> %i" % (origlen, trunclen, len(newgmm), len(self.gmm)))
+            print("prune(): weightsums %g -> %g -> %g -> %g" % (weightsums[0], weightsums[1], weightsums[2], weightsums[3]))
+        # pruning should not alter the total weightsum (which relates to total num items) - so we renormalise
+        if not self.gmm:
+            return
+        weightnorm = weightsums[0] / weightsums[3]
+        for comp in self.gmm:
+            comp.weight *= weightnorm
+
+    def extractstates(self, bias=1.0):
+        """Extract the multiple-target states from the GMM.
+          Returns a list of target states; doesn't alter model state.
+          Based on Table 3 from Vo and Ma paper.
+          I added the 'bias' factor, by analogy with the other method below."""
+        items = []
+        if self.verbose:
+            print("weights:")
+            print([round(comp.weight, 7) for comp in self.gmm])
+        for comp in self.gmm:
+            val = comp.weight * float(bias)
+            if val > 0.5:
+                for _ in range(int(round(val))):
+                    items.append(deepcopy(comp.loc))
+        if self.verbose:
+            for x in items: print(x.T)
+        return items
+
+    @timed('extract')
+    def extractstatesusingintegral(self, bias=1.0):
+        """Extract states based on the expected number of states from the integral of the intensity.
+        This is NOT in the GMPHD paper; added by Dan.
+        "bias" is a multiplier for the est number of items.
+        """
+        numtoadd = int(round(float(bias) * sum(comp.weight for comp in self.gmm)))
+        numtoadd = min(numtoadd, len(self.gmm))  # a heavy merged peak can stand for several targets
+        if self.verbose:
+            print("bias is %g, numtoadd is %i" % (bias, numtoadd))
+        items = []
+        # A temporary list of peaks which will gradually be decimated as we steal from its highest peaks
+        peaks = [{'loc': comp.loc, 'weight': comp.weight, 'id': comp.id} for comp in self.gmm]
+        while numtoadd > 0:
+            windex = 0
+            wsize = 0
+            for which, peak in enumerate(peaks):
+                if peak['weight'] > wsize:
+                    windex = which
+                    wsize = peak['weight']
+            # add the winner
+            items.append([deepcopy(peaks[windex]['loc']), 0, peaks[windex]['id']])
+            #peaks[windex]['weight'] -= 100.0
+            peaks.pop(windex)
+            numtoadd -= 1
+
+        from scipy.optimize import linear_sum_assignment
+        # the previous estimates are the latest entries of the track history
+        pretracks, precomps, prestates = self.tracks.latest()
+        lp, lc = len(pretracks), len(items)
+        states = np.array([item[0][:, 0] for item in items]).reshape(lc, len(self.f))
+        cost = np.ones([lp, lc]) * 100000000
+        if lp and lc:
+            # join the two frames on component id: sort the previous ids and look the current ones up
+            compids = np.array([item[2] for item in items], dtype=np.int64)
+            order = np.argsort(precomps, kind='stable')
+            lo = np.searchsorted(precomps[order], compids, side='left')
+            counts = np.searchsorted(precomps[order], compids, side='right') - lo
+            cols = np.repeat(np.arange(lc), counts)
+            rows = order[np.arange(len(cols)) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)]
+            cost[rows, cols] = self.associationcost(prestates[rows], states[cols])
+        row_ind, col_ind = linear_sum_assignment(cost, maximize=False)
+        for i, idx in enumerate(col_ind):
+            items[idx][1] = int(pretracks[row_ind[i]])
+        for i in np.setdiff1d(np.arange(lc), col_ind):
+            self.track_id += 1
+            items[i][1] = self.track_id
+
+        self.tracks.append(self.frame, [item[1] for item in items], [item[2] for item in items], states)
+        return items
+
+    def associationcost(self, prestates, states):
+        """Cost of continuing a track from each of the previous 'prestates' to the current 'states'
+          in the same row (both (N, dim) arrays); the distance between their positions.
+          Override this for other state layouts, e.g. boxes compared by overlap."""
+        return np.sqrt(((prestates[:, :2] - states[:, :2]) ** 2).sum(axis=1))
+
+    ########################################################################################
+
+    def update_obs_mp(self, anobs, firstid, predicted, nu, s, pkk, k):
+        """The components arising from one observation's interaction with each of the 'predicted'
+          components; they are numbered from 'firstid' on, so len(predicted) ids must be reserved."""
+        anobs = anobs.reshape(len(self.h), 1)  # a view of a row of observations()
+        newgmmpartial = []
+        for j, comp in enumerate(predicted):
+            if self.sqrt:
+                newgmmpartial.append(GmphdComponent(
+                    self.detection * comp.weight * dmvnorm_chol(nu[j], s[j], anobs),
+                    comp.loc + np.dot(k[j], anobs - nu[j]), id=firstid + j, chol=pkk[j], dtype=self.dtype))
+            else:
+                newgmmpartial.append(GmphdComponent(
+                    self.detection * comp.weight * dmvnorm(nu[j], s[j], anobs),
+                    comp.loc + np.dot(k[j], anobs - nu[j]), pkk[j], firstid + j, dtype=self.dtype))
+
+        # The Kappa thing (clutter and reweight)
+        weightsum = sum(newcomp.weight for newcomp in newgmmpartial)
+        reweighter = 1.0 / (self.clutter + weightsum)
+        for newcomp in newgmmpartial:
+            newcomp.weight *= reweighter
+        return newgmmpartial
+
+    def update_mp(self, obs, pool, steps=1):
+        """Run a single GM-PHD step given a new frame of observations.
+          'obs' is this frame's observations, an (M, d) array; see observations().
+          'steps' is the number of frames since the last update, when frames have been skipped.
+          Based on Table 1 from Vo and Ma paper.
+          As update(), but the observations are shared out over the worker 'pool'."""
+        obs = self.observations(obs)
+        predicted = self.reduce(self.predict(steps))
+        nu, s, pkk, k = self.construct(predicted)
+
+        #######################################
+        # Step 4 - update using observations
+        with self.stage('update'):
+            newgmm = self.missed(predicted)
+
+            # then more components are added caused by each obsn's interaction with existing component
+            # each observation gets its own block of ids, so the workers never hand out the same one
+            firstid = self.ids.allocate(len(obs) * len(predicted))
+            firstids = range(firstid, firstid + len(obs) * len(predicted), max(len(predicted), 1))
+            # the workers get a model-only copy, without the mixture and the track history
+            update = partial(self.model().update_obs_mp, predicted=predicted, nu=nu, s=s, pkk=pkk, k=k)
+            result = pool.starmap_async(update, zip(obs, firstids))
+            result = result.get()  # in the order of the observations
+            for newgmmpartial in result:
+                newgmm.extend(newgmmpartial)
+
+        self.gmm = newgmm
+        self.frame += steps
+
+
+class DecimationSchedule:
+    """Decides frame by frame whether to run a full update or only to extrapolate the last states.
+      A full update runs at least every 'every' frames, and sooner whenever the unused
+      per-frame latency 'budget' (in seconds, if given) covers the cost of the last full update.
+
+      Typical usage, for each frame:
+          steps = schedule.next()
+          if steps:
+              g.update(obs, steps)
+              g.prune()
+              estimate = g.extractstatesusingintegral()
+              schedule.done(cost_in_seconds)
+          else:
+              estimate = g.extrapolatestates(schedule.steps)"""
+
+    def __init__(self, every=1, budget=None):
+        self.every = every
+        self.budget = budget
+        self.steps = 0  # frames since the last full update
+        self.credit = 0.0  # unused latency budget, in seconds
+        self.cost = 0.0  # duration of the last full update, in seconds
+
+    def next(self):
+        "Advance by a frame. Returns the 'steps' to pass to update(), or 0 if this frame should be skipped."
+        self.steps += 1
+        if self.budget is not None:
+            self.credit = min(self.credit + self.budget, self.every * self.budget)
+        if self.steps >= self.every or (self.budget is not None and self.credit >= self.cost):
+            steps, self.steps = self.steps, 0
+            return steps
+        return 0
+
+    def done(self, seconds):
+        "Record how long the full update took."
+        self.cost = seconds
+        if self.budget is not None:
+            self.credit = max(self.credit - seconds, 0.0)
@@ -0,0 +1,55 @@
+"""Detection boxes in, filter observations out, without per-frame copies.
+
+read_boxes() loads a MOT detection or ground-truth file into one contiguous
+(N, 4) array of [bb_left, bb_top, bb_width, bb_height] rows in frame order and
+hands out each frame's boxes as a view of it. BoxObservations then converts a
+whole frame of boxes at once into a buffer that it keeps from frame to frame,
+so once the buffer has grown to the busiest frame no conversion allocates. Its
+result is a C-contiguous (M, d) array that Gmphd.update() uses as it is."""
+import numpy as np
+
+SIZES = {'centre': 2, 'ratioheight': 4}  # observation size per mode
+
+
+def read_boxes(filename):
+    """The boxes of a MOT text file (<frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, ...)
+      as a dict of frame number -> (M, 4) view, with an empty view for frames without boxes."""
+    rows = np.loadtxt(filename, delimiter=',', ndmin=2)
+    rows = rows[np.argsort(rows[:, 0], kind='stable')]  # gt.txt is ordered by track, not frame
+    frames = rows[:, 0].astype(int)
+    boxes = np.ascontiguousarray(rows[:, 2:6])
+    if not len(boxes):
+        return {}
+    allframes = np.arange(frames.min(), frames.max() + 1)
+    starts = np.searchsorted(frames, allframes, side='left')
+    ends = np.searchsorted(frames, allframes, side='right')
+    return {frame: boxes[start:end] for frame, start, end in zip(allframes.tolist(), starts, ends)}
+
+
+class BoxObservations:
+    """Converts each frame's (M, 4) boxes into observations, written into a reused buffer.
+
+      'mode' is 'centre', giving [x_c, y_c] as in demo_mot17.py and demo_mot20.py,
+           or 'ratioheight', giving [x_c, y_c, width / height, height] as in ratio_height_tracking.
+      'dtype' should be the filter's, so that the filter takes the result without a copy.
+      The result of a call is overwritten by the next one."""
+
+    def __init__(self, mode='centre', dtype=np.float64, capacity=64):
+        if mode not in SIZES:
+            raise ValueError('unknown observation mode %r' % mode)
+        self.mode = mode
+        self.buffer = np.empty((capacity, SIZES[mode]), dtype=dtype)
+
+    def __call__(self, boxes):
+        "The observations of the (M, 4) 'boxes': a view of the first M rows of the buffer"
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        if len(boxes) > len(self.buffer):
+            self.buffer = np.empty((max(len(boxes), 2 * len(self.buffer)), self.buffer.shape[1]),
+                                   dtype=self.buffer.dtype)
+        obs = self.buffer[:len(boxes)]
+        np.multiply(boxes[:, 2:4], 0.5, out=obs[:, :2])
+        np.add(obs[:, :2], boxes[:, :2], out=obs[:, :2])  # centre of bbox
+        if self.mode == 'ratioheight':
+            np.divide(boxes[:, 2], boxes[:, 3], out=obs[:, 2])
+            obs[:, 3] = boxes[:, 3]
+        return obs
@@ -0,0 +1,121 @@
+"""Spatially partitioned GM-PHD update for wide, crowded scenes.
+
+The image plane is cut into a grid of tiles. Every frame the predicted mixture
+is routed to the tile that contains each component's predicted position, and
+each observation to the tile that contains it; the tiles are then updated and
+pruned in parallel workers. A component lying within 'overlap' pixels of a
+neighbouring tile also takes part there as a ghost, so an observation near a
+border is still weighed against every component that could explain it, while
+each (observation, component) pair is evaluated exactly once. Afterwards the
+tiles' mixtures are gathered back, components near the borders are merged
+across them, and the next frame's routing hands each component to whichever
+tile it has moved into. Component ids are kept throughout, so the track
+labelling of the wrapped Gmphd carries on as usual."""
+from copy import copy
+import numpy as np
+
+
+def _tilestep(tracker, owned, ghosts, obs, firstid, truncthresh, mergethresh):
+    "Update and prune one tile, numbering new components from 'firstid'. Runs in a worker process."
+    predicted = owned + ghosts
+    nu, s, pkk, k = tracker.construct(predicted)
+    # only the tile's own components carry on undetected; ghosts do so in their own tile
+    tracker.gmm = tracker.missed(owned)
+    for index, anobs in enumerate(obs):
+        tracker.gmm.extend(tracker.update_obs_mp(anobs, firstid + index * len(predicted), predicted, nu, s, pkk, k))
+    if tracker.gmm:
+        tracker.prune(truncthresh=truncthresh, mergethresh=mergethresh, maxcomponents=len(tracker.gmm))
+    return tracker.gmm
+
+
+class PartitionedGmphd:
+    """Runs the update and prune of a Gmphd tile by tile over a worker pool.
+
+      Typical usage would be, for each frame of input data, to run:
+          p.update_mp(obs, pool, truncthresh, mergethresh, maxcomponents)
+          estimate = tracker.extractstatesusingintegral()
+
+      'tracker' is the Gmphd whose model and mixture are used; its 'gmm' holds the merged result."""
+
+    def __init__(self, tracker, width, height, tiles=(2, 2), overlap=50):
+        """
+          'width', 'height' are the size of the image plane.
+          'tiles' is the number of tiles across and down.
+          'overlap' is how far, in pixels, a component reaches into neighbouring tiles.
+          """
+        self.tracker = tracker
+        self.xedges = np.linspace(0, width, tiles[0] + 1)
+        self.yedges = np.linspace(0, height, tiles[1] + 1)
+        self.overlap = overlap
+
+    def tileof(self, points):
+        "Index of the tile that owns each of the (N, 2) 'points'; points outside the image go to the nearest tile."
+        nx, ny = len(self.xedges) - 1, len(self.yedges) - 1
+        ix = np.clip(np.searchsorted(self.xedges, points[:, 0], side='right') - 1, 0, nx - 1)
+        iy = np.clip(np.searchsorted(self.yedges, points[:, 1], side='right') - 1, 0, ny - 1)
+        return ix * ny + iy
+
+    def reach(self, points, tile):
+        "Mask of the (N, 2) 'points' that lie within the overlap margin around 'tile'."
+        ny = len(self.yedges) - 1
+        ix, iy = divmod(tile, ny)
+        return ((points[:, 0] >= self.xedges[ix] - self.overlap) & (points[:, 0] < self.xedges[ix + 1] + self.overlap) &
+                (points[:, 1] >= self.yedges[iy] - self.overlap) & (points[:, 1] < self.yedges[iy + 1] + self.overlap))
+
+    def nearborder(self, points):
+        "Mask of the (N, 2) 'points' within the overlap margin of an internal tile border."
+        near = np.zeros(len(points), dtype=bool)
+        for edge in self.xedges[1:-1]:
+            near |= np.abs(points[:, 0] - edge) < self.overlap
+        for edge in self.yedges[1:-1]:
+            near |= np.abs(points[:, 1] - edge) < self.overlap
+        return near
+
+    def update_mp(self, obs, pool, truncthresh=1e-6, mergethresh=0.01, maxcomponents=100, steps=1):
+        """Run a single GM-PHD step, with pruning, given a new frame of observations.
+          'obs' is this frame's observations, an (M, d) array whose first two columns
+          are the image position. The other arguments are as for Gmphd.update() and prune()."""
+        tracker = self.tracker
+        predicted = tracker.reduce(tracker.predict(steps))
+        with tracker.stage('route'):
+            obs = tracker.observations(obs)
+            positions = np.array([comp.loc[:2, 0] for comp in predicted]).reshape(-1, 2)
+            owner = self.tileof(positions)
+            obsowner = self.tileof(obs[:, :2])
+
+            # a model-only copy to ship to the workers, without the mixture and the labelling state
+            model = tracker.model()
+            jobs = []
+            for tile in range((len(self.xedges) - 1) * (len(self.yedges) - 1)):
+                reached = self.reach(positions, tile)
+                owned = [comp for comp, mine in zip(predicted, owner == tile) if mine]
+                ghosts = [comp for comp, ghost in zip(predicted, reached & (owner != tile)) if ghost]
+                tileobs = obs[obsowner == tile]
+                # each tile numbers its new components within its own block of ids
+                firstid = tracker.ids.allocate(len(tileobs) * (len(owned) + len(ghosts)))
+                jobs.append((model, owned, ghosts, tileobs, firstid, truncthresh, mergethresh))
+        # the tiles' construction, update and pruning, in parallel
+        with tracker.stage('update'):
+            results = pool.starmap(_tilestep, jobs)  # in tile order
+
+        with tracker.stage('prune'):
+            # merge across the borders, where neighbouring tiles may have kept near-duplicates
+            gmm = [comp for result in results for comp in result]
+            weightsum = sum(comp.weight for comp in gmm)
+            positions = np.array([comp.loc[:2, 0] for comp in gmm]).reshape(-1, 2)
+            border = self.nearborder(positions)
+            merger = copy(model)
+            merger.gmm = [comp for comp, near in zip(gmm, border) if near]
+            if merger.gmm:
+                merger.prune(truncthresh=0.0, mergethresh=mergethresh, maxcomponents=len(merger.gmm))
+            gmm = [comp for comp, near in zip(gmm, border) if not near] + merger.gmm
+
+            # Now ensure the number of components is within the limit, keeping the weightiest
+            gmm.sort(key=lambda comp: comp.weight, reverse=True)
+            gmm = gmm[:maxcomponents]
+            # as in prune(), the total weight is kept
+            keptsum = sum(comp.weight for comp in gmm)
+            for comp in gmm:
+                comp.weight *= weightsum / keptsum
+        tracker.gmm = gmm
+        tracker.frame += steps
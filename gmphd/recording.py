@@ -0,0 +1,154 @@
+"""Recording of a Gmphd's input, and its deterministic replay.
+
+A recording is an append-only binary file (all numbers little-endian):
+  * a header: MAGIC, a version byte, the length of the JSON config, then the
+    config itself. That is the filter's model (births, F, Q, H, R, clutter, mode,
+    dtype, ...) and the settings of the per-frame steps (prune thresholds, bias,
+    partitioning);
+  * one record per update: FRAME (frame number, steps since the last update,
+    number of observations M) followed by the M x d observations as raw values
+    of the filter's dtype.
+Records are flushed as they are written, so a recorder that dies leaves a
+readable recording; a record cut short at the end is ignored.
+
+A replay builds a fresh filter from the config and feeds it the records. The
+component ids come from the filter's IdAllocator and pool results are
+gathered in order, so a replay gives the same tracks every time, with or
+without a worker pool. It also runs with a StageProfile switched on, so a slow
+frame seen in production can be profiled offline."""
+import json
+import struct
+import numpy as np
+from .filter import Gmphd, GmphdComponent, StageProfile
+from .partition import PartitionedGmphd
+
+MAGIC = b'GMPR'
+VERSION = 1
+HEADER = struct.Struct('<4sBI')
+FRAME = struct.Struct('<qII')
+
+# What a replay does after each update, unless the recording says otherwise; as in the demos.
+SETTINGS = {'truncthresh': 1e-3, 'mergethresh': 5, 'maxcomponents': 50, 'bias': 1.0}
+
+
+def modelconfig(tracker):
+    "The model of a Gmphd as a JSON-able dict, from which makemodel() builds an identical fresh filter"
+    return {
+        # the births are numbered afresh, in the same order, so every later id comes out the same
+        'birthgmm': [{'weight': float(comp.weight), 'loc': comp.loc[:, 0].tolist(), 'cov': comp.cov.tolist()}
+                     for comp in tracker.birthgmm],
+        'survival': float(tracker.survival), 'detection': float(tracker.detection),
+        'f': tracker.f.tolist(), 'q': tracker.q.tolist(), 'h': tracker.h.tolist(), 'r': tracker.r.tolist(),
+        'clutter': float(tracker.clutter), 'sqrt': bool(tracker.sqrt), 'dtype': np.dtype(tracker.dtype).name,
+        'history': tracker.tracks.length, 'timeout': tracker.tracks.timeout, 'budget': tracker.budget,
+    }
+
+
+def makemodel(config):
+    "A fresh Gmphd from a modelconfig() dict"
+    config = dict(config)
+    dtype = np.dtype(config.pop('dtype')).type
+    birthgmm = [GmphdComponent(comp['weight'], comp['loc'], comp['cov'], dtype=dtype)
+                for comp in config.pop('birthgmm')]
+    return Gmphd(birthgmm, dtype=dtype, **config)
+
+
+class Recorder:
+    """Appends the input of every update of a Gmphd to a recording file.
+
+      Typical usage, next to each update of the filter:
+          recorder = Recorder('input.gmpr', tracker, truncthresh=1e-3, mergethresh=5, maxcomponents=50)
+          ...
+          recorder.record(frame, obs, steps)
+          tracker.update(obs, steps)
+
+      'tracker' must be fresh, as a replay starts from a fresh filter.
+      'settings' are stored for the replay: those of SETTINGS ('maxcomponents' being on top of
+      the number of observations), and 'width', 'height', 'tiles' and 'overlap' if the filter
+      is run as a PartitionedGmphd."""
+
+    def __init__(self, filename, tracker, **settings):
+        if tracker.frame or tracker.gmm:
+            raise ValueError('a recording replays from a fresh filter; start recording before the first update')
+        self.dtype = np.dtype(tracker.dtype).newbyteorder('<')
+        self.size = len(tracker.h)
+        config = json.dumps({'model': modelconfig(tracker), 'settings': dict(SETTINGS, **settings)}).encode()
+        self.file = open(filename, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(config)) + config)
+        self.file.flush()
+
+    def record(self, frame, obs, steps=1):
+        "Append a frame's observations, (M, d) array-like, that are updated over 'steps' frames."
+        obs = np.ascontiguousarray(obs, dtype=self.dtype).reshape(-1, self.size)
+        self.file.write(FRAME.pack(frame, steps, len(obs)))
+        self.file.write(obs)  # straight from the array's buffer
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_recording(filename):
+    """The config of a recording and a list of its records, (frame, steps, obs) with each obs
+      an (M, d) view of the file's contents."""
+    with open(filename, 'rb') as file:
+        data = file.read()
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('%s is not a recording of this version' % filename)
+    config = json.loads(data[HEADER.size:HEADER.size + length].decode())
+    dtype = np.dtype(config['model']['dtype']).newbyteorder('<')
+    size = len(config['model']['h'])
+    records = []
+    offset = HEADER.size + length
+    while offset + FRAME.size <= len(data):
+        frame, steps, count = FRAME.unpack_from(data, offset)
+        offset += FRAME.size
+        if offset + count * size * dtype.itemsize > len(data):
+            break  # cut short
+        obs = np.frombuffer(data, dtype=dtype, count=count * size, offset=offset).reshape(count, size)
+        records.append((frame, steps, obs))
+        offset += obs.nbytes
+    return config, records
+
+
+def replay(filename, pool=None, until=None):
+    """Feed a recording through a fresh filter, with profiling on.
+      'pool' is used for update_mp(), or for the tiles if the recording was of a PartitionedGmphd.
+      'until', if given, is the last frame to replay.
+      Returns the filter, its StageProfile, and the (track ids, states) extracted at each frame."""
+    import scipy.linalg, scipy.optimize  # loaded up front, or the first frame's profile would show the import
+    config, records = read_recording(filename)
+    settings = config['settings']
+    tracker = makemodel(config['model'])
+    tracker.profile = profile = StageProfile()
+    tracker.verbose = False  # also in the copies that go to the workers
+    partitioned = None
+    if 'tiles' in settings:
+        if pool is None:
+            raise ValueError('this recording is of a partitioned filter, whose replay needs a pool')
+        partitioned = PartitionedGmphd(tracker, settings['width'], settings['height'], tuple(settings['tiles']),
+                                       settings['overlap'])
+    prune = dict(truncthresh=settings['truncthresh'], mergethresh=settings['mergethresh'])
+    estimates = []
+    for frame, steps, obs in records:
+        if until is not None and frame > until:
+            break
+        profile.begin(frame)
+        if partitioned is not None:
+            partitioned.update_mp(obs, pool, maxcomponents=len(obs) + settings['maxcomponents'], steps=steps, **prune)
+        else:
+            if pool is not None:
+                tracker.update_mp(obs, pool, steps)
+            else:
+                tracker.update(obs, steps)
+            tracker.prune(maxcomponents=len(obs) + settings['maxcomponents'], **prune)
+        items = tracker.extractstatesusingintegral(bias=settings['bias'])
+        estimates.append((frame, [item[1] for item in items], np.array([item[0][:, 0] for item in items])))
+    return tracker, profile, estimates
@@ -0,0 +1,134 @@
+"""Output stage for the demos: drawing of track estimates and a video sink.
+
+The sink streams raw annotated frames straight into an encoder from a
+dedicated writer thread, so the tracker loop never waits on disk or encoding
+(the old way was one JPEG per frame plus a post-hoc ffmpeg run)."""
+import shutil
+import subprocess
+import threading
+import queue
+import numpy as np
+import cv2
+
+
+def draw_points(image, points, labels, radius=8):
+    """Draw a filled circle and an id label for each estimated point.
+      'points' is an (N, 2) array-like of x, y image coordinates.
+      'labels' is a sequence of N track ids."""
+    if len(labels) == 0:
+        return image
+    pts = np.rint(np.asarray(points, dtype=float)).astype(int)  # all coordinates converted at once
+    txt = pts + 5
+    for (x, y), (tx, ty), label in zip(pts.tolist(), txt.tolist(), labels):
+        cv2.circle(image, (x, y), radius=radius, color=(255, 255, 255), thickness=-1)
+        cv2.putText(image, str(label), org=(tx, ty), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.65,
+                    color=(0, 255, 255), thickness=2)
+    return image
+
+
+def draw_boxes(image, boxes, labels):
+    """Draw a rectangle and an id label for each estimated box.
+      'boxes' is an (N, 4) array-like of bb_left, bb_top, bb_width, bb_height.
+      'labels' is a sequence of N track ids."""
+    if len(labels) == 0:
+        return image
+    boxes = np.asarray(boxes, dtype=float)
+    x0, y0 = boxes[:, 0], boxes[:, 1]
+    x1, y1 = x0 + boxes[:, 2], y0 + boxes[:, 3]
+    # (N, 4, 2) corner polygons, so that every box is drawn by a single polylines() call
+    corners = np.rint(np.stack([np.stack([x0, y0], 1), np.stack([x1, y0], 1),
+                                np.stack([x1, y1], 1), np.stack([x0, y1], 1)], 1)).astype(np.int32)
+    cv2.polylines(image, list(corners), isClosed=True, color=(0, 0, 0), thickness=2)
+    for (x, y), label in zip((corners[:, 0] + 5).tolist(), labels):
+        cv2.putText(image, str(label), org=(x, y), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.65,
+                    color=(0, 255, 255), thickness=2)
+    return image
+
+
+def draw_caption(image, text, org):
+    return cv2.putText(image, text, org=org, fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1,
+                       color=(255, 255, 255), thickness=2)
+
+
+class VideoSink:
+    """Encodes frames to a video file from a writer thread fed by a bounded queue.
+
+      Frames are piped as raw BGR into an ffmpeg subprocess when ffmpeg is on
+      the PATH, otherwise written through cv2.VideoWriter. The encoder is opened
+      on the first frame, which fixes the frame size.
+
+      write() never waits for the encoder unless 'block' is set: when the queue
+      is full the frame is dropped and counted in 'dropped'. Set 'block' when every
+      frame must reach the file, e.g. when encoding offline, and check 'dropped' otherwise.
+
+      Typical usage:
+          with VideoSink('out.avi', fps=30) as sink:
+              for image in frames:
+                  sink.write(image)"""
+
+    def __init__(self, filename, fps=30, codec='mpeg4', maxqueue=64, block=False):
+        self.filename = filename
+        self.fps = fps
+        self.codec = codec
+        self.block = block
+        self.dropped = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=maxqueue)
+        self._thread = threading.Thread(target=self._run, name='VideoSink', daemon=True)
+        self._thread.start()
+
+    def write(self, image):
+        """Hand a frame over to the writer thread. Returns False if it was dropped."""
+        if self.error is not None:
+            raise self.error
+        try:
+            self._queue.put(image, block=self.block)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self):
+        """Flush the queued frames and finalise the video file."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open(self, width, height):
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is not None:
+            cmd = [ffmpeg, '-loglevel', 'error', '-y',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', '%dx%d' % (width, height), '-r', str(self.fps),
+                   '-i', '-', '-vcodec', self.codec, self.filename]
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+            return (lambda image: proc.stdin.write(memoryview(np.ascontiguousarray(image)))), \
+                   (lambda: (proc.stdin.close(), proc.wait()))
+        writer = cv2.VideoWriter(self.filename, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height))
+        return writer.write, writer.release
+
+    def _run(self):
+        put, finish = None, None
+        try:
+            while True:
+                image = self._queue.get()
+                if image is None:
+                    break
+                if put is None:
+                    put, finish = self._open(image.shape[1], image.shape[0])
+                put(image)
+        except Exception as err:
+            self.error = err
+            # keep draining so that producers using block=True are never stuck
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if finish is not None:
+                finish()
@@ -0,0 +1,86 @@
+"""The tracking models of the demos, for the scripts that build their own trackers.
+
+'centre' is the constant-velocity model of bbox centres of demo_mot17.py and
+demo_mot20.py; 'ratioheight' the 8-d model of [x_c, y_c, ratio, height] and
+their velocities of ratio_height_tracking/demo_mot17.py, whose tracks are
+continued by box overlap (RatioHeightGmphd). sweep.py and service.py both
+build their filters here. The service therefore starts without loading what
+only the sweep needs (SciPy's assignment solver for the scoring,
+multiprocessing for the pool)."""
+import numpy as np
+from gmphd import Gmphd, GmphdComponent
+
+# The settings of the demos of each model: the per-frame steps, the birth grid and the clutter.
+SETTINGS = {
+    'centre': {
+        'truncthresh': 1e-3,
+        'mergethresh': 5,
+        'maxcomponents': 50,  # on top of the number of observations in the frame
+        'birthspacing': 200,
+        'birthweight': 1e-3,
+        'bias': 1,
+        'clutter': 2.5e-07,
+    },
+    'ratioheight': {
+        'truncthresh': 1e-4,
+        'mergethresh': 0.001,
+        'maxcomponents': 50,
+        'birthspacing': 50,
+        'birthweight': 5e-2,
+        'bias': 20000,  # this high, in effect every component is reported
+        'clutter': 2.5e-07,
+    },
+}
+
+
+class RatioHeightGmphd(Gmphd):
+    "A Gmphd over [x_c, y_c, ratio, height, ...] states, whose tracks are continued by box overlap"
+
+    def associationcost(self, prestates, states):
+        """The IoU, minimised, of the paired rows of 'prestates' and 'states', as this demo has always
+          computed it: each [x_c - w/2, h/2, w, h] box is read as [x1, y1, x2, y2] corners, with
+          inclusive pixel bounds."""
+        a, b = prestates[:, :4].copy(), states[:, :4].copy()
+        for boxes in (a, b):
+            width = boxes[:, 2] * boxes[:, 3]
+            boxes[:, 0], boxes[:, 1], boxes[:, 2] = boxes[:, 0] - width / 2, boxes[:, 3] - boxes[:, 3] / 2, width
+        inter = (np.maximum(0, np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]) + 1) *
+                 np.maximum(0, np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]) + 1))
+        areas = (a[:, 2] - a[:, 0] + 1) * (a[:, 3] - a[:, 1] + 1), (b[:, 2] - b[:, 0] + 1) * (b[:, 3] - b[:, 1] + 1)
+        return inter / (areas[0] + areas[1] - inter)
+
+
+def boxes(states):
+    "The (N, 4) [bb_left, bb_top, bb_width, bb_height] boxes of (N, d) 'ratioheight' states"
+    result = np.array(states[:, :4], dtype=float)
+    result[:, 2] *= result[:, 3]
+    result[:, :2] -= result[:, 2:] / 2.0
+    return result
+
+
+def make_tracker(config, width, height, model='centre', verbose=True):
+    "The filter of the demos of 'model', with the birth grid and clutter of 'config'"
+    if model == 'centre':
+        F = np.array([[1, 0, 1, 0],
+                      [0, 1, 0, 1],
+                      [0, 0, 1, 0],
+                      [0, 0, 0, 1]])
+        P = np.diag([5 ** 2, 10 ** 2, 5 ** 2, 10 ** 2])
+        Q = P / 2
+        H = np.array([[1, 0, 0, 0],
+                      [0, 1, 0, 0]])
+        R = np.diag([5 ** 2, 10 ** 2])
+        birth, cls = [0, 0], Gmphd
+    elif model == 'ratioheight':
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4)  # constant velocity of each of x_c, y_c, ratio, height
+        P = np.diag([10 ** 2, 5 ** 2, 0.01, 5 ** 2, 10 ** 2, 5 ** 2, 0.01, 5 ** 2])
+        Q = np.diag([10 ** 2, 5 ** 2, 0.1, 5 ** 2, 10 ** 2, 5 ** 2, 0.1, 5 ** 2]) / 2
+        H = np.eye(4, 8)
+        R = np.diag([5 ** 2, 10 ** 2, 0.1, 5 ** 2])
+        birth, cls = [0.1, 100, 0, 0, 0, 0], RatioHeightGmphd
+    else:
+        raise ValueError('unknown model %r' % model)
+    birthgmm = [GmphdComponent(weight=config['birthweight'], loc=[x, y] + birth, cov=P)
+                for x in range(0, width, config['birthspacing']) for y in range(0, height, config['birthspacing'])]
+    return cls(birthgmm, 0.9, detection=0.99, f=F, q=Q, h=H, r=R, clutter=config['clutter'], verbose=verbose)
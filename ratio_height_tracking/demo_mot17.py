@@ -1,16 +1,16 @@
-from gmphd import *
 import os
 from os import path
 import collections
 import numpy as np
-import cv2
 import time
-import multiprocessing as mp
+import sys
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..'))
+from gmphd import GmphdComponent, BoxObservations, read_boxes
+from models import RatioHeightGmphd  # continues tracks by box overlap
 
 
 def read_mot(relpath='../MOT17-02/'):
     names = collections.defaultdict(list)
-    detections = collections.defaultdict(list)
 
     # Store the image names.
     for file in os.listdir(path.join(relpath, 'img1')):
@@ -18,13 +18,8 @@ def read_mot(relpath='../MOT17-02/'):
             name, extension = file.split('.')
             names[int(name)] = file
 
-    # Load the detections.
-    # <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, <x>, <y>
-    with open(path.join(relpath, 'gt/gt.txt'), mode='r') as file:
-        for line in file:
-            line = line.replace('\n', '')
-            frame, id, bb_left, bb_top, bb_width, bb_height, conf, x, y = map(float, line.split(','))
-            detections[frame].append(np.array([bb_left, bb_top, bb_width, bb_height]).reshape(4, 1))
+    # Load the detections, as per-frame views of one contiguous array.
+    detections = read_boxes(path.join(relpath, 'gt/gt.txt'))
 
     return names, detections
 
@@ -70,7 +65,7 @@ if __name__ == '__main__':
     birthprob = 0.1  # 0.05 # 0 # 0.2
     survivalprob = 0.9  # 0.95 # 1
     detectprob = 0.99  # 0.999
-    bias = 1  # 8   # tendency to prefer false-positives over false-negatives in the filtered output
+    bias = 20000  # tendency to prefer false-positives over false-negatives; this high, in effect every component is reported
     birthgmm = []
     # Note: I have noticed that the birth gmm needs to be narrow/fine,
     # because otherwise it can lead the pruning algo to lump foreign components together
@@ -81,48 +76,50 @@ if __name__ == '__main__':
             birthgmm.append(gmphd)
     print('Ended Initial GmphdComponent')
 
-    tracker = Gmphd(birthgmm, survivalprob, detection=detectprob, f=F, q=Q, h=H, r=R, clutter=pdf_c)
+    tracker = RatioHeightGmphd(birthgmm, survivalprob, detection=detectprob, f=F, q=Q, h=H, r=R, clutter=pdf_c)
     names, detections = read_mot()
-    pool = mp.Pool(processes=mp.cpu_count())
+    observe = BoxObservations('ratioheight')  # [x_c, y_c, ratio, height], into a buffer reused every frame
+
+    # Worker processes sharing out the observations, or 0 to update in this process.
+    processes = os.cpu_count()
+    # False to run headless: no images are read, annotated, shown or encoded, and OpenCV is never loaded.
+    display = True
+    if processes:
+        import multiprocessing as mp
+        pool = mp.Pool(processes=processes)
+    if display:
+        import cv2
+        from gmphd.render import VideoSink, draw_boxes, draw_caption
+        sink = VideoSink('../MOT17-02/MOT17-02-ratioheight.avi', fps=30)
 
     for frame in range(min(names.keys()), max(names.keys())):
         # Perform a prediction-update step.
         start = time.time()
-        obs = numpy.array(detections[frame], dtype=float)
-
-        obs[:, :2] = obs[:, :2] + obs[:, 2:]/ 2.0  # center of bbox
-        obs[:, 2] = obs[:, 2] / obs[:, 3]
-        tracker.update_mp(obs, pool)
-        #tracker.update(obs)
+        obs = observe(detections[frame])
+        if processes:
+            tracker.update_mp(obs, pool)
+        else:
+            tracker.update(obs)
         tracker.prune(truncthresh=1e-4, mergethresh=0.001, maxcomponents=len(obs) + 50)
         fps = time.time() - start
 
-        integral = sum(np.array([comp.weight for comp in tracker.gmm]))
+        integral = sum(comp.weight for comp in tracker.gmm)
         estitems = tracker.extractstatesusingintegral(bias=bias)
 
-        image = cv2.imread(path.join('../MOT17-02/img1', names[frame]))
-        for comp in estitems:
-            x_c, y_c, r, h, id = comp[0][0], comp[0][1], comp[0][2], comp[0][3], comp[1]
-            w = r * h
-            x_c, y_c = int(x_c - w/2), int(y_c - h/2)
-            w, h = int(w), int(h)
-            #image = cv2.circle(image, (x, y), radius=8,
-            #                   color=(255, 255, 255), thickness=-1)
-            image = cv2.rectangle(image, (x_c, y_c), (x_c + w, y_c + h), color=(0, 0, 0), thickness=2)
-            image = cv2.putText(image, str(id),
-                                org=(x_c+5, y_c+5), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=0.65,
-                                color=(0, 255, 255), thickness=2)
-
-        # Plot the detections.
-        #if frame in detections:
-        #   for x, y, u, v in detections[frame]:
-        #        image = cv2.rectangle(image, (x, y), (x + u, y + v), color=(0, 0, 0), thickness=2)
-        image = cv2.putText(image, 'Frame {}'.format(frame) + ', FPS:{}'.format(round(1 / fps, 2)),
-                            org=(im_width - 400, 30), fontFace=cv2.FONT_HERSHEY_SIMPLEX, fontScale=1,
-                            color=(255, 255, 255), thickness=2)
-        cv2.imwrite('../MOT17-02/output/' + str(frame) + '.jpg', image)
-        cv2.imshow('Image', image)
-        cv2.waitKey(1)
+        if display:
+            image = cv2.imread(path.join('../MOT17-02/img1', names[frame]))
+            # [x_c, y_c, ratio, height] -> [bb_left, bb_top, bb_width, bb_height] for every estimate at once
+            boxes = np.array([comp[0][:4, 0] for comp in estitems]).reshape(-1, 4)
+            boxes[:, 2] *= boxes[:, 3]
+            boxes[:, :2] -= boxes[:, 2:] / 2.0
+            draw_boxes(image, boxes, [comp[1] for comp in estitems])
+            draw_caption(image, 'Frame {}'.format(frame) + ', FPS:{}'.format(round(1 / fps, 2)), org=(im_width - 400, 30))
+            sink.write(image)
+            cv2.imshow('Image', image)
+            cv2.waitKey(1)
 
-    # making video from output images
-    os.system("ffmpeg -r 30 -i ./MOT17-02/output/%d.jpg -vcodec mpeg4 -y ./MOT20-04/video_ffmpeg.mp4")
+    if display:
+        sink.close()
+        if sink.dropped:
+            print('%i frames dropped by the video sink, the encoder fell behind; '
+                  'VideoSink(..., block=True) keeps them all' % sink.dropped)
@@ -0,0 +1,54 @@
+"""Replay a recording of the filter's input and profile it stage by stage.
+
+The recording (see gmphd.recording; `python service.py serve --record FILE`
+and `demo_mot20.py` write them) is fed through a fresh filter with the
+per-stage profiler on. The report gives the time per stage over all frames and
+the slowest frames with their breakdown, so a frame that spiked in production
+can be examined offline. --check replays a second time and verifies that both
+replays extracted identical tracks.
+
+Run: `python replay.py input.gmpr [--processes 4] [--until 1200] [--slowest 10] [--check]`"""
+import argparse
+import sys
+import numpy as np
+from gmphd.filter import StageProfile
+from gmphd.recording import replay
+
+
+def sametracks(first, second):
+    "Whether two replays' estimates are identical, frame by frame"
+    return len(first) == len(second) and all(
+        frame == other and labels == otherlabels and np.array_equal(states, otherstates)
+        for (frame, labels, states), (other, otherlabels, otherstates) in zip(first, second))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('recording')
+    parser.add_argument('--processes', type=int, default=0, help='worker processes, or 0 to update in this process')
+    parser.add_argument('--until', type=int, help='last frame to replay')
+    parser.add_argument('--slowest', type=int, default=10, help='number of slowest frames to list')
+    parser.add_argument('--check', action='store_true', help='replay twice and compare the tracks')
+    args = parser.parse_args()
+
+    pool = None
+    if args.processes:
+        import multiprocessing as mp
+        pool = mp.Pool(processes=args.processes)
+    tracker, profile, estimates = replay(args.recording, pool, args.until)
+
+    print('%i frames, %i tracks' % (len(estimates), tracker.track_id))
+    print('%-10s %12s %12s %12s' % ('stage', 'total s', 'mean ms', 'max ms'))
+    for stage, (total, mean, worst) in profile.summary().items():
+        print('%-10s %12.3f %12.2f %12.2f' % (stage, total, 1e3 * mean, 1e3 * worst))
+    print('slowest frames (ms):')
+    print('%-10s %10s' % ('frame', 'total') + ''.join(' %10s' % stage for stage in StageProfile.STAGES))
+    for frame, times in profile.slowest(args.slowest):
+        print('%-10s %10.2f' % (frame, 1e3 * sum(times.values())) +
+              ''.join(' %10.2f' % (1e3 * times.get(stage, 0.0)) for stage in StageProfile.STAGES))
+
+    if args.check:
+        again = replay(args.recording, pool, args.until)[2]
+        identical = sametracks(estimates, again)
+        print('second replay: %s' % ('identical tracks' if identical else 'DIFFERENT tracks'))
+        sys.exit(0 if identical else 1)
@@ -0,0 +1,251 @@
+"""Streaming tracker service: detections in over a socket, tracks out to subscribers.
+
+Clients send framed messages over TCP or a Unix socket. Every message starts with
+the header HEADER (magic, kind, frame number, row count, row length):
+  * DETECTIONS: followed by count x dim little-endian float32 observations,
+    each already in the filter's observation space (e.g. bbox centres);
+  * SUBSCRIBE: no payload; the connection will receive every frame's tracks as
+    TRACKS messages from then on;
+  * TRACKS: followed by count records of TRACK(dim): int64 track id, float32 state.
+A DETECTIONS batch whose row length is not the filter's observation size is
+rejected, and a frame on which the filter fails is logged and skipped; neither
+stops the service. A subscriber that does not keep up is sent no more frames
+while more than 'maxbuffer' bytes are waiting to go out to it, so a slow reader
+costs it frames rather than costing the service memory.
+
+The filter steps (update, prune, extract) run in an executor, so the event loop
+only ever shuffles bytes. Detection batches wait in a bounded queue; when the
+filter falls behind, 'drop-oldest' discards the oldest waiting batch and
+'coalesce' collapses the whole backlog into the newest batch. Either way the
+next update predicts over every frame since the last one it processed, so
+skipped frames are still accounted for by the motion model.
+
+Run: `python service.py serve --port 7000` and, to load it,
+     `python service.py replay ./MOT20-04/det/det.txt --fps 30 --port 7000`"""
+import argparse
+import asyncio
+import collections
+import logging
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from gmphd import BoxObservations, read_boxes
+
+HEADER = struct.Struct('<4sBIIH')
+MAGIC = b'GMPH'
+DETECTIONS, SUBSCRIBE, TRACKS = 1, 2, 3
+
+log = logging.getLogger('service')
+
+
+def TRACK(dim):
+    return np.dtype([('track', '<i8'), ('state', '<f4', (dim,))])
+
+
+def pack(kind, frame, rows):
+    "Frame a message; 'rows' is an (N, dim) float array or a structured TRACK array."
+    rows = np.ascontiguousarray(rows)
+    dim = rows.shape[1] if rows.dtype.names is None else rows.dtype['state'].shape[0]
+    if rows.dtype.names is None:
+        rows = rows.astype('<f4', copy=False)
+    return HEADER.pack(MAGIC, kind, frame, len(rows), dim) + rows.tobytes()
+
+
+async def readmessage(reader):
+    "Read one framed message: (kind, frame, payload array). Raises IncompleteReadError at end of stream."
+    magic, kind, frame, count, dim = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('bad message header %r' % magic)
+    dtype = TRACK(dim) if kind == TRACKS else np.dtype('<f4')
+    payload = await reader.readexactly(count * dtype.itemsize * (dim if kind != TRACKS else 1))
+    rows = np.frombuffer(payload, dtype=dtype)
+    return kind, frame, rows if kind == TRACKS else rows.reshape(count, dim)
+
+
+class TrackerService:
+    """Serves a Gmphd over a socket.
+
+      'policy' is 'drop-oldest' or 'coalesce', applied when 'maxqueue' batches are already waiting.
+      'pool', if given, is used for update_mp(). The prune and extraction settings are those of the demos.
+      'recorder', if given, is a gmphd.recording.Recorder that every update's input is appended to.
+      'maxbuffer' is the number of bytes that may wait to be sent to a subscriber; beyond it,
+           frames are not sent to that subscriber and are counted in 'subscribers'."""
+
+    def __init__(self, tracker, policy='drop-oldest', maxqueue=4, pool=None,
+                 truncthresh=1e-3, mergethresh=5, maxcomponents=50, bias=1.0, recorder=None, maxbuffer=1 << 20):
+        if policy not in ('drop-oldest', 'coalesce'):
+            raise ValueError('unknown backpressure policy %r' % policy)
+        self.tracker = tracker
+        self.policy = policy
+        self.maxqueue = maxqueue
+        self.pool = pool
+        self.pruneargs = dict(truncthresh=truncthresh, mergethresh=mergethresh)
+        self.maxcomponents = maxcomponents  # on top of the number of observations
+        self.bias = bias
+        self.recorder = recorder
+        self.pending = collections.deque()
+        self.dropped = 0
+        self.rejected = 0  # malformed batches
+        self.failed = 0  # frames on which the filter raised
+        self.lastframe = None
+        self.maxbuffer = maxbuffer
+        self.subscribers = {}  # writer -> frames not sent to it
+        self.executor = ThreadPoolExecutor(max_workers=1)  # the filter is stateful: one step at a time
+        self.ready = None
+
+    def submit(self, frame, obs):
+        "Queue a frame's detections, applying the backpressure policy."
+        if len(self.pending) >= self.maxqueue:
+            if self.policy == 'drop-oldest':
+                self.pending.popleft()
+                self.dropped += 1
+            else:
+                self.dropped += len(self.pending)
+                self.pending.clear()
+        self.pending.append((frame, obs))
+        self.ready.set()
+
+    def step(self, frame, obs):
+        "One filter step, in the executor. Returns the TRACK records of this frame."
+        steps = 1 if self.lastframe is None else max(frame - self.lastframe, 1)
+        self.lastframe = frame
+        if self.recorder is not None:
+            self.recorder.record(frame, obs, steps)
+        if self.pool is not None:
+            self.tracker.update_mp(obs, self.pool, steps)
+        else:
+            self.tracker.update(obs, steps)
+        self.tracker.prune(maxcomponents=len(obs) + self.maxcomponents, **self.pruneargs)
+        items = self.tracker.extractstatesusingintegral(bias=self.bias)
+        records = np.zeros(len(items), dtype=TRACK(len(self.tracker.f)))
+        for record, item in zip(records, items):
+            record['track'], record['state'] = item[1], item[0][:, 0]
+        return records
+
+    async def run(self):
+        "Consume the queue for ever, publishing each frame's tracks."
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self.pending:
+                self.ready.clear()
+                await self.ready.wait()
+            frame, obs = self.pending.popleft()
+            try:
+                records = await loop.run_in_executor(self.executor, self.step, frame, obs)
+            except Exception:
+                self.failed += 1
+                log.exception('frame %i failed, skipped', frame)
+                continue
+            message = pack(TRACKS, frame, records)
+            for writer in list(self.subscribers):
+                if writer.is_closing():
+                    self.subscribers.pop(writer, None)
+                elif writer.transport.get_write_buffer_size() > self.maxbuffer:
+                    self.subscribers[writer] += 1  # too far behind: this frame is not sent to it
+                else:
+                    writer.write(message)  # no drain: a slow subscriber must not hold up the filter
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                kind, frame, rows = await readmessage(reader)
+                if kind == DETECTIONS:
+                    if rows.shape[1] != len(self.tracker.h):
+                        self.rejected += 1
+                        log.warning('frame %i rejected: rows of %i values, expected %i',
+                                    frame, rows.shape[1], len(self.tracker.h))
+                        continue
+                    self.submit(frame, rows)
+                elif kind == SUBSCRIBE:
+                    self.subscribers.setdefault(writer, 0)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # end of stream, or a bad header after which the stream can't be followed
+        finally:
+            skipped = self.subscribers.pop(writer, 0)
+            if skipped:
+                log.warning('subscriber gone, %i frames were not sent to it', skipped)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=7000, unix=None):
+        self.ready = asyncio.Event()
+        if unix:
+            server = await asyncio.start_unix_server(self.handle, path=unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run())
+
+
+async def replay(detfile, fps=30.0, host='127.0.0.1', port=7000, unix=None):
+    """Load generator: sends a MOT det file to a service at 'fps' frames per second,
+      and reports how many frames came back and with what latency."""
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(pack(SUBSCRIBE, 0, np.zeros((0, 2))))
+    frames = list(read_boxes(detfile).items())  # every frame in the file's range, those without boxes too
+    observe = BoxObservations('centre', dtype=np.float32)  # bbox centres, as the demos observe them
+    sent, latencies = {}, []
+
+    async def receive():
+        while len(latencies) < len(frames):
+            kind, frame, records = await readmessage(reader)
+            if kind == TRACKS:
+                latencies.append(time.perf_counter() - sent[frame])
+
+    receiver = asyncio.ensure_future(receive())
+    start = time.perf_counter()
+    for i, (frame, boxes) in enumerate(frames):
+        await asyncio.sleep(max(start + i / fps - time.perf_counter(), 0))
+        sent[frame] = time.perf_counter()
+        writer.write(pack(DETECTIONS, frame, observe(boxes)))
+        await writer.drain()
+    try:
+        await asyncio.wait_for(receiver, timeout=5.0)  # the results of the last frames, or of what was dropped
+    except asyncio.TimeoutError:
+        pass
+    writer.close()
+    print('sent %i frames at %g fps, received %i' % (len(frames), fps, len(latencies)))
+    if latencies:
+        print('latency: mean %.1f ms, p95 %.1f ms, max %.1f ms' % (
+            1e3 * np.mean(latencies), 1e3 * np.percentile(latencies, 95), 1e3 * np.max(latencies)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help='run the tracker service')
+    serve.add_argument('--width', type=int, default=1920, help='image width, for the birth grid')
+    serve.add_argument('--height', type=int, default=1080, help='image height, for the birth grid')
+    serve.add_argument('--policy', default='drop-oldest', choices=['drop-oldest', 'coalesce'])
+    serve.add_argument('--maxqueue', type=int, default=4)
+    serve.add_argument('--maxbuffer', type=int, default=1 << 20, help='bytes that may wait for a subscriber')
+    serve.add_argument('--record', help='record the filter input to this file, for replay.py')
+    load = sub.add_parser('replay', help='replay a MOT det.txt file into a running service')
+    load.add_argument('detfile')
+    load.add_argument('--fps', type=float, default=30.0)
+    for command in (serve, load):
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=7000)
+        command.add_argument('--unix', help='Unix socket path, instead of TCP')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        logging.basicConfig(level=logging.INFO)
+        from models import SETTINGS, make_tracker  # the demos' model and settings
+        import scipy.optimize  # the labelling needs it; loaded now rather than on the first frame
+        config = SETTINGS['centre']
+        settings = dict(truncthresh=config['truncthresh'], mergethresh=config['mergethresh'],
+                        maxcomponents=config['maxcomponents'], bias=config['bias'])
+        tracker = make_tracker(config, args.width, args.height, verbose=False)
+        recorder = None
+        if args.record:
+            from gmphd.recording import Recorder
+            recorder = Recorder(args.record, tracker, **settings)
+        service = TrackerService(tracker, policy=args.policy, maxqueue=args.maxqueue, recorder=recorder,
+                                 maxbuffer=args.maxbuffer, **settings)
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    else:
+        asyncio.run(replay(args.detfile, args.fps, args.host, args.port, args.unix))
@@ -0,0 +1,248 @@
+"""Parameter sweep of the tracker's speed/accuracy knobs over MOT sequences.
+
+Every configuration of the knobs below is run over each sequence in a process
+pool; the detections (and ground truth) of a sequence are parsed once, in the
+parent, and handed to each worker once when it starts. For every configuration
+the sweep records frames per second, the peak number of components entering
+prune(), and MOTA / IDF1 against gt/gt.txt, writes them all to a CSV file and
+prints the Pareto front of speed against accuracy.
+
+--model picks the tracking model of models.py: 'centre' (demo_mot17.py,
+demo_mot20.py), whose outputs are points, or 'ratioheight'
+(ratio_height_tracking/demo_mot17.py), whose outputs are boxes. A point matches a
+ground-truth box when it lies inside the box, and a box when their IoU is at least
+0.5; per frame the matching is a minimum-cost (distance, or 1 - IoU) assignment,
+and IDF1 uses the usual global assignment of track ids to ground-truth ids.
+
+Run: `python sweep.py ./MOT17-02 --grid` or `python sweep.py ./MOT17-02 ./MOT17-04 --samples 50`
+     or `python sweep.py ./MOT17-02 --detections gt --model ratioheight`"""
+import argparse
+import configparser
+import csv
+import itertools
+import multiprocessing as mp
+import os
+import random
+import time
+from os import path
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from gmphd import BoxObservations, read_boxes
+from models import SETTINGS, boxes, make_tracker
+
+# The other values to try of each knob, per model; the setting of the demos is tried first.
+OTHERS = {
+    'centre': {
+        'truncthresh': [1e-4, 1e-2],
+        'mergethresh': [1, 10],
+        'maxcomponents': [20, 100],  # on top of the number of observations in the frame
+        'birthspacing': [100, 300],
+        'birthweight': [1e-4, 1e-2],
+        'bias': [0.8, 1.2],
+        'clutter': [2.5e-08, 2.5e-06],
+    },
+    'ratioheight': {
+        'truncthresh': [1e-5, 1e-3],
+        'mergethresh': [0.01, 1],
+        'maxcomponents': [20, 100],
+        'birthspacing': [100, 200],
+        'birthweight': [5e-3, 1e-1],
+        'bias': [1, 1.2],
+        'clutter': [2.5e-08, 2.5e-06],
+    },
+}
+SPACES = {model: {key: [SETTINGS[model][key]] + values for key, values in others.items()}
+          for model, others in OTHERS.items()}
+
+_sequences = {}  # the parsed sequences, in each worker
+
+
+def load_sequence(seqdir, detections='det'):
+    """Parse a MOT sequence folder into a dict with the image size, the first and last
+      frame, per-frame (M, 4) detection boxes and per-frame ground truth ((N,) ids, (N, 4) boxes)."""
+    info = configparser.ConfigParser()
+    info.read(path.join(seqdir, 'seqinfo.ini'))
+    dets = read_boxes(path.join(seqdir, detections, detections + '.txt'))
+    first, last = min(dets), max(dets)
+    gt = None
+    gtfile = path.join(seqdir, 'gt', 'gt.txt')
+    if path.exists(gtfile):
+        # <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, ...
+        rows = np.loadtxt(gtfile, delimiter=',', ndmin=2)
+        rows = rows[rows[:, 6] != 0]  # entries flagged 0 are not evaluated
+        gtframes = rows[:, 0].astype(int)
+        gt = {frame: (rows[gtframes == frame, 1].astype(int), rows[gtframes == frame, 2:6])
+              for frame in range(first, last + 1)}
+    if info.has_section('Sequence'):
+        width, height = info.getint('Sequence', 'imWidth'), info.getint('Sequence', 'imHeight')
+    else:
+        boxes = np.vstack(list(dets.values()))
+        width, height = int(np.ceil((boxes[:, 0] + boxes[:, 2]).max())), int(np.ceil((boxes[:, 1] + boxes[:, 3]).max()))
+    return {'width': width, 'height': height, 'first': first, 'last': last, 'dets': dets, 'gt': gt}
+
+
+class Accuracy:
+    "Accumulates the CLEAR MOT and identity counts for one sequence."
+
+    def __init__(self):
+        self.ngt = self.nhyp = self.misses = self.falsepos = self.switches = 0
+        self.lastmatch = {}  # gt id -> hypothesis id it was last matched to
+        self.pairs = {}  # (gt id, hypothesis id) -> number of frames in which they could match
+
+    def add(self, gtids, gtboxes, hypids, hyps):
+        """One frame: the ground-truth ids and (N, 4) boxes, and the tracker's ids and outputs,
+          either (M, 2) points or (M, 4) boxes ([bb_left, bb_top, bb_width, bb_height])."""
+        self.ngt += len(gtids)
+        self.nhyp += len(hypids)
+        if len(gtids) == 0 or len(hypids) == 0:
+            self.misses += len(gtids)
+            self.falsepos += len(hypids)
+            return
+        if hyps.shape[1] == 4:
+            left = np.maximum(gtboxes[:, None, 0], hyps[None, :, 0])
+            right = np.minimum(gtboxes[:, None, 0] + gtboxes[:, None, 2], hyps[None, :, 0] + hyps[None, :, 2])
+            top = np.maximum(gtboxes[:, None, 1], hyps[None, :, 1])
+            bottom = np.minimum(gtboxes[:, None, 1] + gtboxes[:, None, 3], hyps[None, :, 1] + hyps[None, :, 3])
+            inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+            union = (gtboxes[:, None, 2] * gtboxes[:, None, 3] + hyps[None, :, 2] * hyps[None, :, 3]) - inter
+            iou = inter / np.maximum(union, 1e-9)
+            inside = iou >= 0.5  # the matches allowed
+            cost = 1.0 - iou
+        else:
+            inside = ((hyps[None, :, 0] >= gtboxes[:, None, 0]) &
+                      (hyps[None, :, 0] <= gtboxes[:, None, 0] + gtboxes[:, None, 2]) &
+                      (hyps[None, :, 1] >= gtboxes[:, None, 1]) &
+                      (hyps[None, :, 1] <= gtboxes[:, None, 1] + gtboxes[:, None, 3]))
+            centres = gtboxes[:, :2] + gtboxes[:, 2:] / 2.0
+            cost = np.linalg.norm(centres[:, None, :] - hyps[None, :, :], axis=2)
+        cost[~inside] = 1e9
+        rows, cols = linear_sum_assignment(cost)
+        matched = inside[rows, cols]
+        rows, cols = rows[matched], cols[matched]
+        self.misses += len(gtids) - len(rows)
+        self.falsepos += len(hypids) - len(rows)
+        for row, col in zip(rows, cols):
+            gtid, hypid = gtids[row], hypids[col]
+            if self.lastmatch.get(gtid, hypid) != hypid:
+                self.switches += 1
+            self.lastmatch[gtid] = hypid
+        for row, col in zip(*np.nonzero(inside)):
+            key = (gtids[row], hypids[col])
+            self.pairs[key] = self.pairs.get(key, 0) + 1
+
+    def idtp(self):
+        "Identity true positives, from the best one-to-one assignment of hypothesis ids to gt ids"
+        if not self.pairs:
+            return 0
+        gtkeys = sorted({gtid for gtid, _ in self.pairs})
+        hypkeys = sorted({hypid for _, hypid in self.pairs})
+        counts = np.zeros((len(gtkeys), len(hypkeys)))
+        gtindex = {key: i for i, key in enumerate(gtkeys)}
+        hypindex = {key: i for i, key in enumerate(hypkeys)}
+        for (gtid, hypid), count in self.pairs.items():
+            counts[gtindex[gtid], hypindex[hypid]] = count
+        rows, cols = linear_sum_assignment(counts, maximize=True)
+        return counts[rows, cols].sum()
+
+
+def run(config, seqdir, model='centre'):
+    "Run one configuration over one sequence, in a worker. Returns the timings and the accuracy counts."
+    seq = _sequences[seqdir]
+    tracker = make_tracker(config, seq['width'], seq['height'], model, verbose=False)
+    accuracy = Accuracy() if seq['gt'] is not None else None
+    elapsed, peak, nframes = 0.0, 0, 0
+    observe = BoxObservations(model)  # center of bbox, or [x_c, y_c, ratio, height]
+    for frame in range(seq['first'], seq['last'] + 1):
+        obs = observe(seq['dets'][frame])
+        start = time.perf_counter()
+        tracker.update(obs)
+        peak = max(peak, len(tracker.gmm))
+        tracker.prune(truncthresh=config['truncthresh'], mergethresh=config['mergethresh'],
+                      maxcomponents=len(obs) + config['maxcomponents'])
+        items = tracker.extractstatesusingintegral(bias=config['bias'])
+        elapsed += time.perf_counter() - start
+        nframes += 1
+        if accuracy is not None:
+            gtids, gtboxes = seq['gt'][frame]
+            states = np.array([item[0][:, 0] for item in items]).reshape(len(items), len(tracker.f))
+            accuracy.add(gtids, gtboxes, [item[1] for item in items],
+                         boxes(states) if model == 'ratioheight' else states[:, :2])
+    result = {'frames': nframes, 'seconds': elapsed, 'peakcomponents': peak}
+    if accuracy is not None:
+        result.update(gt=accuracy.ngt, hyp=accuracy.nhyp, misses=accuracy.misses, falsepos=accuracy.falsepos,
+                      switches=accuracy.switches, idtp=accuracy.idtp())
+    return result
+
+
+def summarise(config, results):
+    "Combine the per-sequence results of one configuration into a row of the report."
+    row = dict(config)
+    row['fps'] = sum(r['frames'] for r in results) / max(sum(r['seconds'] for r in results), 1e-9)
+    row['peakcomponents'] = max(r['peakcomponents'] for r in results)
+    scored = [r for r in results if 'gt' in r]
+    ngt = sum(r['gt'] for r in scored)
+    nhyp = sum(r['hyp'] for r in scored)
+    if ngt:
+        row['mota'] = 1.0 - sum(r['misses'] + r['falsepos'] + r['switches'] for r in scored) / ngt
+        row['idf1'] = 2.0 * sum(r['idtp'] for r in scored) / (ngt + nhyp)
+    else:
+        row['mota'] = row['idf1'] = float('nan')
+    return row
+
+
+def paretofront(rows, objectives=('fps', 'mota', 'idf1')):
+    "The rows not dominated by any other row, when every objective is to be maximised (NaN objectives are ignored)"
+    keys = [key for key in objectives if not any(np.isnan(row[key]) for row in rows)]
+    front = []
+    for row in rows:
+        dominated = any(all(other[key] >= row[key] for key in keys) and any(other[key] > row[key] for key in keys)
+                        for other in rows)
+        if not dominated:
+            front.append(row)
+    return sorted(front, key=lambda row: row['fps'], reverse=True)
+
+
+def configurations(space, grid, samples, seed):
+    if grid:
+        return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    rng = random.Random(seed)
+    return [{key: rng.choice(values) for key, values in space.items()} for _ in range(samples)]
+
+
+def _initworker(sequences):
+    _sequences.update(sequences)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sequences', nargs='+', help='MOT sequence folders, e.g. ./MOT17-02')
+    parser.add_argument('--detections', default='det', choices=['det', 'gt'],
+                        help='feed the tracker det/det.txt (as demo_mot20.py) or gt/gt.txt (as demo_mot17.py)')
+    parser.add_argument('--model', default='centre', choices=list(SPACES),
+                        help='the tracking model, see models.py')
+    parser.add_argument('--grid', action='store_true', help='the full grid of SPACES[model] instead of random samples')
+    parser.add_argument('--samples', type=int, default=20, help='number of random configurations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default='sweep.csv')
+    args = parser.parse_args()
+
+    sequences = {seqdir: load_sequence(seqdir, args.detections) for seqdir in args.sequences}
+    space = SPACES[args.model]
+    configs = configurations(space, args.grid, args.samples, args.seed)
+    jobs = [(config, seqdir, args.model) for config in configs for seqdir in args.sequences]
+    print('%i configurations x %i sequences, %s model' % (len(configs), len(args.sequences), args.model))
+    with mp.Pool(processes=args.processes, initializer=_initworker, initargs=(sequences,)) as pool:
+        results = pool.starmap(run, jobs)
+
+    n = len(args.sequences)
+    rows = [summarise(config, results[i * n:(i + 1) * n]) for i, config in enumerate(configs)]
+    columns = list(space) + ['fps', 'peakcomponents', 'mota', 'idf1']
+    with open(args.out, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    print('all results written to %s; Pareto front:' % args.out)
+    print(' '.join('%12s' % column for column in columns))
+    for row in paretofront(rows):
+        print(' '.join('%12.4g' % row[column] for column in columns))